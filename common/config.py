@@ -21,7 +21,7 @@ class ConfigRedis:
         parser = argparse.ArgumentParser()
         parser.add_argument('--redis-host')
         parser.add_argument('--redis-port')
-        args = parser.parse_args()
+        args, _ = parser.parse_known_args()
 
         self.host: str = ''
         self.port: int = 0
@@ -77,6 +77,32 @@ class ArchiveActionType(IntEnum):
     MoveToNewLocation = 1
 
 
+class FrameFormat(IntEnum):
+    Json = 0
+    Binary = 1
+
+
+class TransportType(IntEnum):
+    PubSub = 0
+    Streams = 1
+
+
+class DispatchMode(IntEnum):
+    Pool = 0
+    SourceAffinity = 1
+
+
+class PrevImageCacheType(IntEnum):
+    Manager = 0
+    SharedMemory = 1
+
+
+class OverflowPolicy(IntEnum):
+    Block = 0
+    DropOldest = 1
+    DropNewest = 2
+
+
 class DeviceConfig:
     def __init__(self):
         self.device_name = platform.node()
@@ -193,6 +219,82 @@ class SnapshotConfig:
         self.meta_color_enabled: bool = False
         self.meta_color_count: int = 5
         self.meta_color_quality: int = 1
+        # SourceAffinity routes every source to the same worker process, so the motion detection state stays in that process
+        self.dispatch_mode: DispatchMode = DispatchMode.Pool
+        self.shard_queue_size: int = 8  # frames in a shard worker at once, a newer one then replaces the waiting one
+        self.prev_image_cache_type: PrevImageCacheType = PrevImageCacheType.Manager
+        # a slot per source, sized for the largest previous image: the analysis frame (the snapshot size / md_analysis_scale), grayscale for
+        # the OpenCV detector (1 channel), in color for Psnr at md_analysis_scale 1 (3 channels). All of them must fit into /dev/shm
+        self.prev_image_slot_count: int = 16
+        self.prev_image_max_width: int = 1920
+        self.prev_image_max_height: int = 1080
+        self.prev_image_channels: int = 1
+        self.warm_up_batch_size: int = 100
+        # reorders the independent filters per source by their measured cost and rejection rate
+        self.filter_adaptive_enabled: bool = False
+        self.filter_stats_window: int = 100  # frames
+        self.filter_reorder_interval: int = 50  # frames
+        self.filter_report_interval: int = 300  # seconds, every worker logs the stats of its own chains, 0 means never
+        # tests the boxes against the zones and masks rasterized at the snapshot resolution instead of the polygons
+        self.zone_bitmap_enabled: bool = False
+        self.zone_bitmap_min_overlap: float = 0.  # fraction of the box area, 0 means any overlap
+        self.md_detector_idle_timeout: float = 600.  # seconds, the motion detector of a source which sends no frame is dropped, 0 means never
+        # a 32x18 thumbnail comparison ahead of any motion detection type, the detector runs only if it crosses the threshold
+        self.md_pre_check_enabled: bool = False
+        self.md_pre_check_threshold: float = 2.  # mean absolute difference of the thumbnail pixels (0-255)
+        # post-processing of the motion boxes before the zone and mask filters
+        self.md_box_post_processing_enabled: bool = False
+        self.md_box_merge_distance: int = 0  # pixels, the boxes closer than that are merged. -1 means no merging
+        self.md_box_min_area_ratio: float = 0.  # of the frame area, the smaller boxes are dropped
+        self.md_box_max_count: int = 0  # the largest ones are kept, 0 means no limit
+        # a frame is forwarded only after motion in count of the last window frames, then at most once per interval until the motion ends.
+        # the motion started/ended events are published on motion_events
+        self.md_confirmation_enabled: bool = False
+        self.md_confirmation_count: int = 2
+        self.md_confirmation_window: int = 3  # frames
+        self.md_episode_forward_interval: float = 1.  # seconds, 0 means every frame which has motion
+        self.md_episode_idle_timeout: float = 10.  # seconds, ends the episode of a source which has stopped sending frames, 0 means never
+        # drops the frames which arrive faster than SourceModel.snapshot_frame_rate (capped by in_max_fps) before they are decoded. It runs
+        # in the main process, so it is the only ingestion rate limit which sees every frame of a source
+        self.admission_enabled: bool = False
+        self.in_max_fps: float = 0.  # frames per second of every source, 0 means no limit, it enables the admission by itself
+        self.admission_tolerance: float = .8  # fraction of the frame interval
+        self.admission_report_interval: int = 60  # seconds
+        # per source token bucket of the frames forwarded to snapshot_in, SourceModel.snapshot_forward_rate overrides the rate. It is exact in the
+        # SourceAffinity dispatch mode only. In the Pool mode every worker gets rate / process count, which is an approximation: it holds only
+        # while the frames of a source spread evenly over the workers, a burst which lands on a few of them may exceed or undershoot the rate
+        self.forward_rate: float = 0.  # frames per second, 0 means no limit
+        self.forward_burst: float = 2.  # frames
+        self.forward_report_interval: int = 60  # seconds
+        # publishes the crops of the motion boxes to snapshot_in instead of the whole frame, the out side still publishes the whole frame
+        self.roi_crop_enabled: bool = False
+        self.roi_crop_padding: int = 32  # pixels
+        self.roi_crop_max_count: int = 2
+        self.roi_crop_max_area_ratio: float = .5  # the whole frame is published if the crops cover more of it
+        self.roi_crop_frame_ttl: int = 30  # seconds, the whole frame is kept in redis until the detections of its crops come back
+        # plain dict caches per process, invalidated by data_changed, instead of the Manager dict proxies
+        self.local_cache_enabled: bool = False
+        self.local_cache_grace_period: float = 5.  # seconds
+        # bounded dispatching instead of a new thread per pub/sub message
+        self.dispatcher_enabled: bool = False
+        self.dispatcher_thread_count: int = 4
+        self.dispatcher_queue_size: int = 64
+        self.dispatcher_overflow_policy: OverflowPolicy = OverflowPolicy.DropOldest
+        self.dispatcher_max_in_flight: int = 0  # 0 means twice the process count
+        # latest-frame-wins coalescing per source on read_service
+        self.coalescing_enabled: bool = False
+        self.coalescing_max_age: float = 0.  # seconds, 0 means never drop a pending frame
+        self.coalescing_report_interval: int = 60  # seconds
+        # both formats are always accepted, this one is only for the published frames
+        self.publish_format: FrameFormat = FrameFormat.Json
+        # transport of read_service, snapshot_in and snapshot_out. Streams lets the instances share the load via a consumer group
+        self.transport: TransportType = TransportType.PubSub
+        self.stream_group_name: str = 'snapshot_service'
+        self.stream_max_len: int = 1000
+        self.stream_claim_min_idle: int = 30000  # milliseconds
+        self.stream_claim_max_age: int = 60000  # milliseconds, the older pending entries are acknowledged without being handled, 0 means never
+        self.stream_read_count: int = 10
+        self.stream_block: int = 1000  # milliseconds
 
 
 class HubConfig:
@@ -234,7 +336,13 @@ class Config:
         config_json = obj.__get_connection().get(obj.__get_redis_key())
         if config_json is not None:
             simple_namespace = json.loads(config_json, object_hook=lambda d: SimpleNamespace(**d))
-            obj.__dict__.update(simple_namespace.__dict__)
+            for key, value in simple_namespace.__dict__.items():
+                current = obj.__dict__.get(key)
+                # merges the sections instead of replacing them, so the fields which are not saved on redis yet keep their default values
+                if isinstance(value, SimpleNamespace) and hasattr(current, '__dict__'):
+                    current.__dict__.update(value.__dict__)
+                else:
+                    obj.__dict__[key] = value
         return obj
 
     def to_json(self):
@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, List, Tuple
 from redis import Redis
 
 from common.data.redis_mapper import RedisMapper
@@ -17,3 +17,26 @@ class BaseRepository:
     @staticmethod
     def to_redis(model: Any) -> dict:
         return RedisMapper(model).to_redis()
+
+    # scans the namespace and fetches the hashes in pipelined batches instead of one round trip per key
+    def _scan_hashes(self, batch_size: int) -> List[Tuple[str, dict]]:
+        ret: List[Tuple[str, dict]] = []
+        keys: List[bytes] = []
+        for key in self.connection.scan_iter(match=f'{self.namespace}*', count=batch_size):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                ret.extend(self.__get_hashes(keys))
+                keys = []
+        if len(keys) > 0:
+            ret.extend(self.__get_hashes(keys))
+        return ret
+
+    def __get_hashes(self, keys: List[bytes]) -> List[Tuple[str, dict]]:
+        pipeline = self.connection.pipeline(transaction=False)
+        for key in keys:
+            pipeline.hgetall(key)
+        ret: List[Tuple[str, dict]] = []
+        for key, dic in zip(keys, pipeline.execute(raise_on_error=False)):
+            if isinstance(dic, dict) and len(dic) > 0:  # the other key types on the same namespace return an error
+                ret.append((key.decode(self._encoding)[len(self.namespace):], dic))
+        return ret
@@ -0,0 +1,35 @@
+import json
+import os
+import socket
+
+from redis import Redis
+
+from common.data.base_repository import BaseRepository
+from common.utilities import logger
+
+
+# the filter chain stats live in the worker processes, each worker writes its own ones into the hash of its chain (filter_stats:<chain>),
+# one field per worker (host-pid, read on every write since the repository is created before the workers are forked). The hash expires if
+# no worker has written it for ttl seconds
+class FilterStatsRepository(BaseRepository):
+    def __init__(self, connection: Redis):
+        super().__init__(connection, 'filter_stats:')
+
+    def __create_key(self, chain_name: str) -> str:
+        return self.namespace + chain_name.replace(' ', '_')
+
+    def set(self, chain_name: str, stats: dict, ttl: int):
+        key = self.__create_key(chain_name)
+        try:
+            pipeline = self.connection.pipeline()
+            pipeline.hset(key, f'{socket.gethostname()}-{os.getpid()}', json.dumps(stats))
+            if ttl > 0:
+                pipeline.expire(key, ttl)
+            pipeline.execute()
+        except BaseException as ex:
+            logger.error(f'an error occurred while saving the stats of {chain_name}, ex: {ex}')
+
+    # worker name: stats
+    def get_all(self, chain_name: str) -> dict:
+        dic = self.connection.hgetall(self.__create_key(chain_name))
+        return {key.decode(self._encoding): json.loads(value) for key, value in dic.items()}
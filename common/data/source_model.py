@@ -489,6 +489,20 @@ class MotionDetectionType(IntEnum):
     OpenCV = 1
     ImageHash = 2
     Psnr = 3
+    BackgroundSubtraction = 4
+    BlockGrid = 5
+
+
+class ImageHashType(IntEnum):
+    AverageHash = 0
+    DHash = 1
+    PHash = 2
+    WHash = 3
+
+
+class BackgroundSubtractorType(IntEnum):
+    MOG2 = 0
+    KNN = 1
 
 
 class SourceModel(FFmpegModel):
@@ -509,11 +523,28 @@ class SourceModel(FFmpegModel):
         self.snapshot_frame_rate: int = 1
         self.snapshot_width: int = 640
         self.snapshot_height: int = 360
+        self.snapshot_forward_rate: float = -1.  # frames per second forwarded to object detection, -1 means the one in the snapshot config
         self.md_type: MotionDetectionType = MotionDetectionType.OpenCV
         self.md_opencv_threshold: int = 30
         self.md_contour_area_limit: int = 10000
         self.md_imagehash_threshold: int = 3
+        self.md_imagehash_type: ImageHashType = ImageHashType.AverageHash
+        self.md_analysis_scale: int = 1  # 1, 2, 4 or 8. Motion detection runs on a grayscale frame decoded at 1/scale by the JPEG decoder
         self.md_psnr_threshold: float = 0.2
+        self.md_bg_subtractor_type: BackgroundSubtractorType = BackgroundSubtractorType.MOG2
+        self.md_bg_history: int = 500  # frames
+        self.md_bg_var_threshold: float = 16.  # MOG2
+        self.md_bg_dist2_threshold: float = 400.  # KNN
+        self.md_bg_learning_rate: float = -1.  # -1 means the rate is chosen by the history
+        self.md_bg_width: int = 320  # the model runs on frames resized to this width
+        self.md_grid_columns: int = 16
+        self.md_grid_rows: int = 9
+        self.md_grid_threshold: float = 12.  # mean absolute difference of a cell (0-255)
+        # OpenCV motion detection ignores the masked pixels (and the ones out of the zones if zones_only is set) before thresholding,
+        # the zone and mask filters are skipped for its boxes if skip_filters is set
+        self.md_pixel_mask_enabled: bool = False
+        self.md_pixel_mask_zones_only: bool = False
+        self.md_pixel_mask_skip_filters: bool = False
 
         self.ffmpeg_reader_frame_rate: int = 1
         self.ffmpeg_reader_width: int = 640
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+from typing import List
 from redis.client import Redis
 
 from common.data.base_repository import BaseRepository
 from common.data.source_model import SourceModel
+from common.utilities import logger
 
 
 class SourceRepository(BaseRepository):
@@ -19,3 +21,12 @@ class SourceRepository(BaseRepository):
         if not dic:
             return None
         return self.from_redis(SourceModel(), dic)
+
+    def get_all(self, batch_size: int) -> List[SourceModel]:
+        ret: List[SourceModel] = []
+        for identifier, dic in self._scan_hashes(batch_size):
+            try:
+                ret.append(self.from_redis(SourceModel(), dic))
+            except BaseException as ex:
+                logger.error(f'{self.namespace}{identifier} could not be mapped, ex: {ex}')
+        return ret
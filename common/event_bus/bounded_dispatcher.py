@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from collections import deque
+from threading import Thread, Condition
+from typing import Callable
+
+from common.config import OverflowPolicy
+from common.utilities import logger
+
+
+class DispatcherStats:
+    def __init__(self):
+        self.received_count: int = 0
+        self.dispatched_count: int = 0
+        self.dropped_oldest_count: int = 0
+        self.dropped_newest_count: int = 0
+        self.failed_count: int = 0
+
+    def get_dropped_count(self) -> int:
+        return self.dropped_oldest_count + self.dropped_newest_count
+
+
+class BoundedDispatcher:
+    def __init__(self, name: str, fn: Callable, thread_count: int, queue_size: int, overflow_policy: OverflowPolicy, on_drop: Callable | None = None):
+        self.name = name
+        self.fn = fn
+        self.on_drop = on_drop  # called with the dropped item, outside the lock
+        self.thread_count = thread_count if thread_count > 0 else 1
+        self.queue_size = queue_size if queue_size > 0 else 1
+        self.overflow_policy = overflow_policy
+        self.stats = DispatcherStats()
+        self.__queue = deque()
+        self.__cond = Condition()
+        self.__threads = []
+        self.__stopped: bool = False
+
+    def start(self):
+        for j in range(self.thread_count):
+            th = Thread(target=self.__loop, name=f'{self.name}-dispatcher-{j}')
+            th.daemon = True
+            th.start()
+            self.__threads.append(th)
+
+    # the subscriber stops it before it reconnects, so that the threads of a dead subscription do not leak
+    def stop(self, timeout: float = 5.):
+        with self.__cond:
+            self.__stopped = True
+            self.__queue.clear()
+            self.__cond.notify_all()
+        for th in self.__threads:
+            th.join(timeout)
+        self.__threads.clear()
+
+    def put(self, item):
+        dropped = None
+        with self.__cond:
+            if self.__stopped:
+                return
+            self.stats.received_count += 1
+            while len(self.__queue) >= self.queue_size:
+                if self.overflow_policy == OverflowPolicy.DropOldest:
+                    dropped = self.__queue.popleft()
+                    self.stats.dropped_oldest_count += 1
+                    self.__log_drop()
+                elif self.overflow_policy == OverflowPolicy.DropNewest:
+                    self.stats.dropped_newest_count += 1
+                    self.__log_drop()
+                    dropped = item
+                    break
+                else:
+                    self.__cond.wait()
+                    if self.__stopped:
+                        return
+            if dropped is not item:
+                self.__queue.append(item)
+                self.__cond.notify_all()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+
+    def __log_drop(self):
+        dropped_count = self.stats.get_dropped_count()
+        if dropped_count % 1000 == 1:
+            logger.warning(f'{self.name} dispatcher queue is full, total dropped message count: {dropped_count}')
+
+    def __loop(self):
+        while True:
+            with self.__cond:
+                while len(self.__queue) == 0 and not self.__stopped:
+                    self.__cond.wait()
+                if self.__stopped:
+                    return
+                item = self.__queue.popleft()
+                self.__cond.notify_all()
+            try:
+                self.fn(item)
+                with self.__cond:
+                    self.stats.dispatched_count += 1
+            except BaseException as ex:
+                with self.__cond:
+                    self.stats.failed_count += 1
+                logger.error(f'an error occurred while dispatching a message on {self.name}, ex: {ex}')
@@ -1,13 +1,19 @@
+from __future__ import annotations
+
 from threading import Thread
+from typing import Callable
 
+from common.config import OverflowPolicy
+from common.event_bus.bounded_dispatcher import BoundedDispatcher
 from common.event_bus.event_handler import EventHandler
-from common.utilities import crate_redis_connection, RedisDb
+from common.utilities import crate_redis_connection, RedisDb, logger
 
 
 class EventBus:
     def __init__(self, channel: str):
         self.connection = crate_redis_connection(RedisDb.EVENTBUS, True, 2)
         self.channel = channel
+        self.dispatcher: BoundedDispatcher | None = None
 
     def publish(self, event):  # added for AI service
         self.connection.publish(self.channel, event)
@@ -25,6 +31,38 @@ class EventBus:
             th.daemon = True
             th.start()
 
+    # handles the messages on the subscriber thread in the order they arrive, the handler must not block for long
+    def subscribe_sync(self, event_handler: EventHandler):
+        pub_sub = self.connection.pubsub()
+        pub_sub.subscribe(self.channel)
+        for event in pub_sub.listen():
+            try:
+                event_handler.handle(event)
+            except BaseException as ex:
+                logger.error(f'an error occurred while handling a message on {self.channel}, ex: {ex}')
+
+    def _start_dispatcher(self, event_handler: EventHandler, thread_count: int, queue_size: int, overflow_policy: OverflowPolicy,
+                          on_drop: Callable | None = None) -> BoundedDispatcher:
+        self._stop_dispatcher()
+        self.dispatcher = BoundedDispatcher(self.channel, event_handler.handle, thread_count, queue_size, overflow_policy, on_drop)
+        self.dispatcher.start()
+        return self.dispatcher
+
+    def _stop_dispatcher(self):
+        if self.dispatcher is not None:
+            self.dispatcher.stop()
+            self.dispatcher = None
+
+    def subscribe_bounded(self, event_handler: EventHandler, thread_count: int, queue_size: int, overflow_policy: OverflowPolicy):
+        dispatcher = self._start_dispatcher(event_handler, thread_count, queue_size, overflow_policy)
+        try:
+            pub_sub = self.connection.pubsub()
+            pub_sub.subscribe(self.channel)
+            for event in pub_sub.listen():
+                dispatcher.put(event)
+        finally:
+            self._stop_dispatcher()
+
     def unsubscribe(self):
         pub_sub = self.connection.pubsub()
         pub_sub.unsubscribe(self.channel)
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
 
 
@@ -5,3 +7,10 @@ class EventHandler(ABC):
     @abstractmethod
     def handle(self, event):
         pass
+
+
+# acknowledges an event of a transport which needs it (streams), the handlers call it once the event has been processed or dropped
+def ack_event(event: dict | None):
+    ack = event.get('ack') if event is not None else None
+    if ack is not None:
+        ack()
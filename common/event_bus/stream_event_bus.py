@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import os
+import socket
+import time
+from functools import partial
+from typing import Callable
+
+from redis import Redis
+from redis.exceptions import ResponseError
+
+from common.config import OverflowPolicy
+from common.event_bus.event_bus import EventBus
+from common.event_bus.event_handler import EventHandler, ack_event
+from common.utilities import logger
+
+
+# Redis Streams consumer group transport. Instances in the same group share the entries instead of receiving all of them like pub/sub does.
+# The events are converted to the pub/sub message shape, so the same handlers work on both transports.
+class StreamEventBus(EventBus):
+    def __init__(self, channel: str, group_name: str, max_len: int, claim_min_idle: int, read_count: int = 10, block: int = 1000,
+                 connection: Redis | None = None, claim_max_age: int = 0):
+        super().__init__(channel)
+        if connection is not None:
+            self.connection = connection
+        self.group_name = group_name
+        self.consumer_name = f'{socket.gethostname()}-{os.getpid()}'
+        self.max_len = max_len
+        self.claim_min_idle = claim_min_idle  # milliseconds
+        self.claim_max_age = claim_max_age  # milliseconds, 0 means the claimed entries are never too old
+        self.read_count = read_count
+        self.block = block  # milliseconds
+        self.data_field = 'data'
+        self.__last_claimed_at: float = 0.
+
+    def publish(self, event):
+        self.connection.xadd(self.channel, {self.data_field: event}, maxlen=self.max_len if self.max_len > 0 else None, approximate=True)
+
+    def create_group(self):
+        try:
+            self.connection.xgroup_create(self.channel, self.group_name, id='$', mkstream=True)
+        except ResponseError as err:
+            if 'BUSYGROUP' not in str(err):
+                raise
+
+    def subscribe_async(self, event_handler: EventHandler):
+        self.__listen(event_handler.handle)
+
+    # the entries are already handled on the reading thread
+    def subscribe_sync(self, event_handler: EventHandler):
+        self.__listen(event_handler.handle)
+
+    def subscribe_bounded(self, event_handler: EventHandler, thread_count: int, queue_size: int, overflow_policy: OverflowPolicy):
+        dispatcher = self._start_dispatcher(event_handler, thread_count, queue_size, overflow_policy, ack_event)
+        try:
+            self.__listen(dispatcher.put)
+        finally:
+            self._stop_dispatcher()
+
+    def unsubscribe(self):
+        self.connection.xgroup_delconsumer(self.channel, self.group_name, self.consumer_name)
+
+    # called from the callback threads of the pools as well, so it never raises
+    def ack(self, *entry_ids):
+        try:
+            self.connection.xack(self.channel, self.group_name, *entry_ids)
+        except BaseException as ex:
+            logger.error(f'an error occurred while acknowledging the entries on {self.channel}, ex: {ex}')
+
+    # the handler acknowledges the entry via 'ack' once a worker has processed it (or it has been dropped on purpose), so the entries of a
+    # crashed worker stay pending and they are claimed again after claim_min_idle
+    def __create_event(self, entry_id: bytes, fields: dict) -> dict:
+        return {'type': 'message', 'channel': self.channel, 'id': entry_id, 'data': fields.get(self.data_field.encode()),
+                'ack': partial(self.ack, entry_id)}
+
+    def __dispatch(self, fn: Callable, entries: list):
+        for entry_id, fields in entries:
+            if fields is None:  # the entry was trimmed by MAXLEN before it was claimed
+                self.ack(entry_id)
+                continue
+            try:
+                fn(self.__create_event(entry_id, fields))
+            except BaseException as ex:
+                # it would fail again on every claim
+                logger.error(f'an error occurred while handling a stream entry on {self.channel}, ex: {ex}')
+                self.ack(entry_id)
+
+    # takes over the pending entries of the other consumers which have not acknowledged them for claim_min_idle, the ones of this consumer may
+    # still be in its workers. The entries older than claim_max_age are acknowledged without being handled, they are stale frames by then
+    def claim_pending(self, fn: Callable):
+        seconds, microseconds = self.connection.time()
+        now = seconds * 1000 + microseconds // 1000  # milliseconds, in the clock of the entry ids
+        for consumer in self.connection.xinfo_consumers(self.channel, self.group_name):
+            name = consumer['name']
+            name = name.decode() if isinstance(name, bytes) else name
+            if name != self.consumer_name and consumer['pending'] > 0:
+                self.__claim_pending(fn, name, now)
+        self.__remove_dead_consumers()
+
+    def __claim_pending(self, fn: Callable, consumer_name: str, now: int):
+        while True:
+            pending = self.connection.xpending_range(self.channel, self.group_name, min='-', max='+', count=self.read_count,
+                                                     consumername=consumer_name, idle=self.claim_min_idle)
+            entry_ids = [item['message_id'] for item in pending]
+            if len(entry_ids) == 0:
+                break
+            stale_ids = [entry_id for entry_id in entry_ids if 0 < self.claim_max_age < now - self.__get_timestamp(entry_id)]
+            if len(stale_ids) > 0:
+                self.ack(*stale_ids)
+                logger.warning(f'{len(stale_ids)} stale pending entries of {consumer_name} have been dropped on {self.channel}')
+            entry_ids = [entry_id for entry_id in entry_ids if entry_id not in stale_ids]
+            if len(entry_ids) > 0:
+                entries = self.connection.xclaim(self.channel, self.group_name, self.consumer_name, self.claim_min_idle, entry_ids)
+                if len(entries) > 0:
+                    logger.warning(f'{len(entries)} pending entries of {consumer_name} have been claimed on {self.channel} by {self.consumer_name}')
+                    self.__dispatch(fn, entries)
+            if len(pending) < self.read_count:
+                break
+
+    @staticmethod
+    def __get_timestamp(entry_id: bytes | str) -> int:
+        entry_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+        return int(entry_id.split('-')[0])
+
+    def __remove_dead_consumers(self):
+        for consumer in self.connection.xinfo_consumers(self.channel, self.group_name):
+            name = consumer['name']
+            name = name.decode() if isinstance(name, bytes) else name
+            if name != self.consumer_name and consumer['pending'] == 0 and consumer['idle'] > self.claim_min_idle:
+                self.connection.xgroup_delconsumer(self.channel, self.group_name, name)
+                logger.warning(f'dead consumer {name} has been removed from {self.channel}')
+
+    def __listen(self, fn: Callable):
+        self.create_group()
+        while True:
+            now = time.monotonic()
+            if self.claim_min_idle > 0 and (now - self.__last_claimed_at) * 1000. > self.claim_min_idle:
+                self.__last_claimed_at = now
+                self.claim_pending(fn)
+            ret = self.connection.xreadgroup(self.group_name, self.consumer_name, {self.channel: '>'}, count=self.read_count, block=self.block)
+            for _, entries in ret or []:
+                self.__dispatch(fn, entries)
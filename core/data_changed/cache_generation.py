@@ -0,0 +1,48 @@
+import time
+from multiprocessing import RawValue
+from typing import List
+
+from common.utilities import logger
+
+
+# process local caches are invalidated by the data_changed listener of each process. The main process counts the events on a shared counter,
+# so that a worker which has missed one of them notices it and drops its whole cache instead of serving stale models forever.
+class CacheGeneration:
+    def __init__(self, grace_period: float):
+        self.shared = RawValue('Q', 0)
+        self.grace_period = grace_period
+        self.applied: int = 0
+        self.mismatch_since: float = 0.
+        self.dicts: List[dict] = []
+
+    def register(self, dic: dict):
+        if all(d is not dic for d in self.dicts):
+            self.dicts.append(dic)
+
+    # called by the main process
+    def increment(self):
+        self.shared.value += 1
+        self.applied += 1
+
+    # called by the workers
+    def apply(self):
+        self.applied += 1
+
+    def validate(self):
+        shared = self.shared.value
+        if shared == self.applied:
+            self.mismatch_since = 0.
+            return
+        # the listener of this process may not have received the last event yet
+        now = time.monotonic()
+        if self.mismatch_since == 0.:
+            self.mismatch_since = now
+            return
+        if now - self.mismatch_since < self.grace_period:
+            return
+        if shared > self.applied:
+            logger.warning(f'a data changed event has been missed (generation: {shared}, applied: {self.applied}), local caches are cleared')
+            for dic in self.dicts:
+                dic.clear()
+        self.applied = shared
+        self.mismatch_since = 0.
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Callable, Any
+
+
+# the indexes built from the polygons of an od are not pickled, so an od which comes out of a Manager dict (a new copy on every get) would
+# rebuild them on every frame. They are kept per process instead, keyed by the id and the generation of the od, which changes with its zones
+# and masks, so a refreshed od never gets the old ones. The keys start with the id and the generation, the items of the older generations of
+# an od are dropped once a newer one is created, and the least recently used ones are dropped after max_count
+class GeometryCache:
+    def __init__(self, max_count: int):
+        self.max_count = max_count
+        self.items: OrderedDict[tuple, Any] = OrderedDict()
+
+    def get(self, key: tuple, create: Callable[[], Any]) -> Any:
+        item = self.items.get(key)
+        if item is not None:
+            self.items.move_to_end(key)
+            return item
+        item = create()
+        for old_key in [k for k in self.items if k[0] == key[0] and k[1] != key[1]]:
+            del self.items[old_key]
+        self.items[key] = item
+        while len(self.items) > self.max_count:
+            self.items.popitem(last=False)
+        return item
+
+
+geometry_cache = GeometryCache(256)
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from typing import List
+
+import numpy as np
+import numpy.typing as npt
+import shapely
+from shapely.geometry import Polygon, box
+from shapely.prepared import prep
+
+from core.filters.detections import DetectionBox
+
+shapely_2 = int(shapely.__version__.split('.')[0]) >= 2
+
+
+# tests all detection boxes of a frame against all the polygons at once. Shapely 2 queries an STRtree of the prepared polygons with the boxes
+# as one vectorized call, shapely 1.8 (the jetson image) falls back to testing the boxes one by one against the prepared polygons
+class GeometryIndex:
+    def __init__(self, polygons: List[Polygon]):
+        self.polygons = [polygon for polygon in polygons if polygon.length > 0]
+        if shapely_2:
+            self.geometries = np.array(self.polygons, dtype=object)
+            shapely.prepare(self.geometries)
+            self.tree = shapely.STRtree(self.geometries)
+        else:
+            self.prepared_list = [prep(polygon) for polygon in self.polygons]
+
+    # returns a boolean mask, True for the boxes which intersect with any of the polygons
+    def intersects(self, boxes: List[DetectionBox]) -> npt.NDArray:
+        ret = np.zeros(len(boxes), dtype=bool)
+        if len(boxes) == 0 or len(self.polygons) == 0:
+            return ret
+        if shapely_2:
+            coords = np.array([(b.x1, b.y1, b.x2, b.y2) for b in boxes], dtype=float)
+            areas = shapely.box(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+            box_indices, _ = self.tree.query(areas, predicate='intersects')
+            ret[box_indices] = True
+        else:
+            for j, b in enumerate(boxes):
+                area = box(b.x1, b.y1, b.x2, b.y2)
+                ret[j] = any(prepared.intersects(area) for prepared in self.prepared_list)
+        return ret
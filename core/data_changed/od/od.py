@@ -1,9 +1,19 @@
+from __future__ import annotations
+
 import datetime
+import zlib
 from typing import List
 from datetime import timedelta
+
+import numpy as np
+import numpy.typing as npt
 from shapely.geometry import Polygon
 
+from common.utilities import config
+from core.data_changed.od.geometry_cache import geometry_cache
+from core.data_changed.od.geometry_index import GeometryIndex
 from core.data_changed.od.od_model import OdModel
+from core.data_changed.od.zone_bitmap import ZoneBitmap, rasterize
 from core.filters.detections import DetectionBox
 
 
@@ -23,11 +33,8 @@ class Od:
         self.time_in_enabled: bool = False
         self.separator = 'º'
         self.array_separator = '+'
-
-    @staticmethod
-    def __create_area(do: DetectionBox):
-        x1, y1, x2, y2 = do.x1, do.y1, do.x2, do.y2
-        return Polygon([(x1, y1), (x1, y2), (x2, y1), (x2, y2)])
+        # changes with the zones and the masks, it keys the indexes of them in the process local geometry cache
+        self.generation: int = 0
 
     @staticmethod
     def __create_polygon(value: str, separator: str):
@@ -55,27 +62,49 @@ class Od:
                 ret.append(zone_list)
         return ret
 
-    def is_in_zones(self, do: DetectionBox) -> bool:
+    # the bitmaps are rasterized at the snapshot resolution, so the resolution is a part of their keys
+    def __get_index(self, name: str, polygons: List[Polygon], width: int, height: int) -> GeometryIndex | ZoneBitmap:
+        snapshot_config = config.snapshot
+        if snapshot_config.zone_bitmap_enabled and width > 0 and height > 0:
+            min_overlap = snapshot_config.zone_bitmap_min_overlap
+            return geometry_cache.get((self.id, self.generation, name, width, height, min_overlap),
+                                      lambda: ZoneBitmap(polygons, width, height, min_overlap))
+        return geometry_cache.get((self.id, self.generation, name), lambda: GeometryIndex(polygons))
+
+    # returns a boolean mask, True for the boxes which are in any of the zones (all of them if no zone is specified)
+    def get_in_zones_mask(self, boxes: List[DetectionBox], width: int = 0, height: int = 0) -> npt.NDArray:
         if len(self.zones_list) == 0:
-            return True
-        area = self.__create_area(do)
-        for zone_list in self.zones_list:
-            if zone_list.length == 0:
-                continue
-            if zone_list.intersects(area):
-                return True
-        return False
+            return np.ones(len(boxes), dtype=bool)
+        return self.__get_index('zones', self.zones_list, width, height).intersects(boxes)
 
-    def is_in_masks(self, do: DetectionBox) -> bool:
+    # returns a boolean mask, True for the boxes which are in any of the masks
+    def get_in_masks_mask(self, boxes: List[DetectionBox], width: int = 0, height: int = 0) -> npt.NDArray:
         if len(self.masks_list) == 0:
-            return False
-        area = self.__create_area(do)
-        for mask_list in self.masks_list:
-            if mask_list.length == 0:
-                continue
-            if mask_list.intersects(area):
-                return True
-        return False
+            return np.zeros(len(boxes), dtype=bool)
+        return self.__get_index('masks', self.masks_list, width, height).intersects(boxes)
+
+    # 255 for the pixels which motion detection should look at, 0 for the masked ones (and the ones out of the zones if zones_only is set).
+    # fx and fy map the snapshot resolution, which the polygons are drawn on, to the frame. None if no pixel is masked
+    def get_pixel_mask(self, width: int, height: int, fx: float, fy: float, zones_only: bool) -> npt.NDArray | None:
+        zones_only = zones_only and len(self.zones_list) > 0
+        if len(self.masks_list) == 0 and not zones_only:
+            return None
+        return geometry_cache.get((self.id, self.generation, 'pixel_mask', width, height, fx, fy, zones_only),
+                                  lambda: self.__create_pixel_mask(width, height, fx, fy, zones_only))
+
+    def __create_pixel_mask(self, width: int, height: int, fx: float, fy: float, zones_only: bool) -> npt.NDArray:
+        if zones_only:
+            pixel_mask = rasterize(self.zones_list, width, height, fx, fy, 255)
+        else:
+            pixel_mask = np.full((height, width), 255, dtype=np.uint8)
+        pixel_mask[rasterize(self.masks_list, width, height, fx, fy) > 0] = 0
+        return pixel_mask
+
+    def is_in_zones(self, do: DetectionBox) -> bool:
+        return bool(self.get_in_zones_mask([do])[0])
+
+    def is_in_masks(self, do: DetectionBox) -> bool:
+        return bool(self.get_in_masks_mask([do])[0])
 
     def is_selected(self, cls_idx: int) -> bool:
         return cls_idx in self.selected_list
@@ -130,6 +159,7 @@ class Od:
 
         self.zones_list = self.__create_polygon_list(od_model.zones_list)
         self.masks_list = self.__create_polygon_list(od_model.masks_list)
+        self.generation = zlib.crc32(f'{od_model.zones_list}{self.array_separator * 2}{od_model.masks_list}'.encode('utf-8'))
         self.time_in_enabled, self.start_time = self.__get_time(od_model.start_time)
         if self.time_in_enabled:
             self.time_in_enabled, self.end_time = self.__get_time(od_model.end_time)
@@ -1,6 +1,9 @@
+from __future__ import annotations
+
 from redis.client import Redis
 
 from common.utilities import logger
+from core.data_changed.cache_generation import CacheGeneration
 from core.data_changed.od.od import Od
 from core.data_changed.od.od_model import OdModel
 from core.data_changed.od.od_repository import OdRepository
@@ -9,6 +12,7 @@ from core.data_changed.source_cache import BaseCache, SourceCache
 
 class OdCache(BaseCache):
     dic = {}
+    generation: CacheGeneration | None = None
 
     def __init__(self, connection: Redis, source_cache: SourceCache):
         self.od_repository = OdRepository(connection)
@@ -18,7 +22,15 @@ class OdCache(BaseCache):
     def set_dict(dic: dict):
         OdCache.dic = dic
 
+    @staticmethod
+    def set_generation(generation: CacheGeneration | None):
+        OdCache.generation = generation
+        if generation is not None:
+            generation.register(OdCache.dic)
+
     def get(self, source_id: str) -> Od | None:
+        if OdCache.generation is not None:
+            OdCache.generation.validate()
         if source_id not in OdCache.dic:
             od_model = self.od_repository.get(source_id)
             if od_model is None:
@@ -38,3 +50,15 @@ class OdCache(BaseCache):
 
     def remove(self, source_id: str):
         OdCache.dic[source_id] = None
+
+    # creates the missing od records as well, so that get() does not need to write on the hot path
+    def warm_up(self, batch_size: int) -> int:
+        od_models = {model.id: model for model in self.od_repository.get_all(batch_size)}
+        missing_list = [OdModel().map_from(source_model) for source_id, source_model in SourceCache.dic.items()
+                        if source_model is not None and source_id not in od_models]
+        if len(missing_list) > 0:
+            self.od_repository.add_all(missing_list)
+            od_models.update({model.id: model for model in missing_list})
+        loaded = set(OdCache.dic.keys())
+        OdCache.dic.update({source_id: Od().map_from(od_model) for source_id, od_model in od_models.items() if source_id not in loaded})
+        return len(od_models)
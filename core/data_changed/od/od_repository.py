@@ -1,9 +1,10 @@
 from __future__ import annotations
 
+from typing import List
 from redis.client import Redis
 
 from common.data.base_repository import BaseRepository
-from common.utilities import datetime_now
+from common.utilities import datetime_now, logger
 from core.data_changed.od.od_model import OdModel
 
 
@@ -20,6 +21,13 @@ class OdRepository(BaseRepository):
         dic = self.to_redis(model)
         return self.connection.hset(key, mapping=dic)
 
+    def add_all(self, models: List[OdModel]):
+        pipeline = self.connection.pipeline(transaction=False)
+        for model in models:
+            model.created_at = datetime_now()
+            pipeline.hset(self._get_key(model.id), mapping=self.to_redis(model))
+        pipeline.execute()
+
     def get(self, identifier: str) -> OdModel | None:
         key = self._get_key(identifier)
         dic = self.connection.hgetall(key)
@@ -27,3 +35,12 @@ class OdRepository(BaseRepository):
             return None
         model: OdModel = self.from_redis(OdModel(), dic)
         return model
+
+    def get_all(self, batch_size: int) -> List[OdModel]:
+        ret: List[OdModel] = []
+        for identifier, dic in self._scan_hashes(batch_size):
+            try:
+                ret.append(self.from_redis(OdModel(), dic))
+            except BaseException as ex:
+                logger.error(f'{self.namespace}{identifier} could not be mapped, ex: {ex}')
+        return ret
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import List
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from shapely.geometry import Polygon
+
+from core.filters.detections import DetectionBox
+
+
+def rasterize(polygons: List[Polygon], width: int, height: int, fx: float = 1., fy: float = 1., value: int = 1) -> npt.NDArray:
+    bitmap = np.zeros((height, width), dtype=np.uint8)
+    points_list = [np.rint(np.asarray(polygon.exterior.coords) * (fx, fy)).astype(np.int32) for polygon in polygons if polygon.length > 0]
+    if len(points_list) > 0:
+        cv2.fillPoly(bitmap, points_list, value)
+    return bitmap
+
+
+# rasterizes the polygons once at the snapshot resolution and keeps the summed-area table of the bitmap, so the covered area of a box
+# is four lookups regardless of how many polygons (and vertices) there are
+class ZoneBitmap:
+    def __init__(self, polygons: List[Polygon], width: int, height: int, min_overlap: float):
+        self.width = width
+        self.height = height
+        self.min_overlap = min_overlap
+        self.integral = cv2.integral(rasterize(polygons, width, height))  # (height + 1, width + 1)
+
+    # returns a boolean mask, True for the boxes whose overlapping area fraction is over min_overlap (any overlap if it is 0)
+    def intersects(self, boxes: List[DetectionBox]) -> npt.NDArray:
+        if len(boxes) == 0:
+            return np.zeros(0, dtype=bool)
+        coords = np.array([(b.x1, b.y1, b.x2, b.y2) for b in boxes], dtype=float)
+        x1 = np.clip(np.floor(np.minimum(coords[:, 0], coords[:, 2])), 0, self.width).astype(np.int32)
+        x2 = np.clip(np.ceil(np.maximum(coords[:, 0], coords[:, 2])), 0, self.width).astype(np.int32)
+        y1 = np.clip(np.floor(np.minimum(coords[:, 1], coords[:, 3])), 0, self.height).astype(np.int32)
+        y2 = np.clip(np.ceil(np.maximum(coords[:, 1], coords[:, 3])), 0, self.height).astype(np.int32)
+        s = self.integral
+        covered = s[y2, x2] - s[y1, x2] - s[y2, x1] + s[y1, x1]
+        if self.min_overlap <= 0.:
+            return covered > 0
+        areas = (x2 - x1) * (y2 - y1)
+        return (areas > 0) & (covered >= self.min_overlap * np.maximum(areas, 1))
@@ -15,3 +15,6 @@ class PrevImageCache:
 
     def set(self, source_id: str, prev_image: any):
         self.dic[source_id] = prev_image
+
+    def remove(self, source_id: str):
+        self.dic.pop(source_id, None)
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import os
+import shutil
+from multiprocessing import Lock
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Set
+
+import numpy as np
+import numpy.typing as npt
+
+from common.utilities import logger
+from core.data_changed.prev_image_cache import PrevImageCache
+
+
+class PrevImageSlotError(Exception):
+    pass
+
+
+# keeps the previous images in a shared memory slab, one fixed slot per source, instead of pickling them through the Manager process.
+# it must be created before the worker processes are forked. The slots need the same amount of space in /dev/shm (see docker --shm-size).
+# A previous image which does not fit into a slot (or has no free slot left) is kept in the process local dict instead, with a warning once
+# per source, so the motion detection of that source goes on in the workers which see its frames
+class SharedMemoryPrevImageCache(PrevImageCache):
+    max_source_id_length = 64
+    max_ndim = 4
+    meta_dtype = np.dtype([('source_id', f'S{max_source_id_length}'), ('generation', '<u8'), ('ndim', 'u1'), ('shape', '<u4', (max_ndim,))])
+    shm_path = '/dev/shm'
+
+    def __init__(self, slot_count: int, slot_size: int):
+        super().__init__({})
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.__check_shm_size(slot_count * (slot_size + self.meta_dtype.itemsize))
+        self.meta_memory = SharedMemory(create=True, size=self.meta_dtype.itemsize * slot_count)
+        self.data_memory = SharedMemory(create=True, size=slot_size * slot_count)
+        self.meta = np.ndarray((slot_count,), dtype=self.meta_dtype, buffer=self.meta_memory.buf)
+        self.meta[:] = np.zeros((slot_count,), dtype=self.meta_dtype)
+        self.allocation_lock = Lock()
+        self.slot_locks: List[Lock] = [Lock() for _ in range(slot_count)]
+        self.__slots: Dict[str, int] = {}  # process local lookup of the slot indexes, validated against the key of the slot
+        self.__warned: Set[str] = set()  # the sources whose previous images have been kept in the local dict
+
+    # a slab which is larger than /dev/shm is created fine, but the process is killed by SIGBUS once the pages are touched
+    def __check_shm_size(self, size: int):
+        if not os.path.isdir(self.shm_path):
+            return
+        free = shutil.disk_usage(self.shm_path).free
+        if size > free:
+            raise PrevImageSlotError(f'previous image slots need {size} bytes but {self.shm_path} has {free} bytes free, '
+                                     f'increase the shm size (docker --shm-size) or decrease the slot count or the previous image size')
+
+    # the local index can be stale once another process has freed the slot, so the callers check the key of the slot under its lock
+    def __find_slot(self, source_id: str, key: bytes, allocate: bool) -> int:
+        slot = self.__slots.get(source_id, -1)
+        if slot > -1:
+            return slot
+        with self.allocation_lock:
+            indices = np.flatnonzero(self.meta['source_id'] == key)
+            if len(indices) > 0:
+                slot = int(indices[0])
+            elif allocate:
+                empty_indices = np.flatnonzero(self.meta['source_id'] == b'')
+                if len(empty_indices) == 0:
+                    raise PrevImageSlotError(f'no free previous image slot is left for source({source_id}), slot count: {self.slot_count}')
+                slot = int(empty_indices[0])
+                with self.slot_locks[slot]:
+                    self.meta['source_id'][slot] = key
+                    self.meta['ndim'][slot] = 0
+            else:
+                return -1
+        self.__slots[source_id] = slot
+        return slot
+
+    # None if the source id does not fit into the key of a slot
+    def __create_key(self, source_id: str) -> bytes | None:
+        key = source_id.encode('utf-8')
+        return key if len(key) <= self.max_source_id_length else None
+
+    def __is_owner(self, slot: int, key: bytes) -> bool:
+        return self.meta['source_id'][slot] == key
+
+    def __get_buffer(self, slot: int) -> memoryview:
+        offset = slot * self.slot_size
+        return self.data_memory.buf[offset:offset + self.slot_size]
+
+    # returns a copy, it is taken under the slot lock so a concurrent set can not tear it
+    def get(self, source_id: str) -> npt.NDArray | None:
+        if source_id in self.dic:
+            return self.dic[source_id]
+        key = self.__create_key(source_id)
+        slot = self.__find_slot(source_id, key, False) if key is not None else -1
+        if slot < 0:
+            return None
+        with self.slot_locks[slot]:
+            if not self.__is_owner(slot, key):
+                self.__slots.pop(source_id, None)
+                return None
+            ndim = int(self.meta['ndim'][slot])
+            if ndim == 0:
+                return None
+            shape = tuple(int(s) for s in self.meta['shape'][slot][:ndim])
+            return np.ndarray(shape, dtype=np.uint8, buffer=self.__get_buffer(slot)).copy()
+
+    def get_generation(self, source_id: str) -> int:
+        if source_id in self.dic:
+            return 0
+        key = self.__create_key(source_id)
+        slot = self.__find_slot(source_id, key, False) if key is not None else -1
+        return int(self.meta['generation'][slot]) if slot > -1 and self.__is_owner(slot, key) else 0
+
+    def has(self, source_id: str) -> bool:
+        if source_id in self.dic:
+            return True
+        key = self.__create_key(source_id)
+        slot = self.__find_slot(source_id, key, False) if key is not None else -1
+        return slot > -1 and self.__is_owner(slot, key) and self.meta['ndim'][slot] > 0
+
+    def set(self, source_id: str, prev_image: npt.NDArray | None):
+        if prev_image is None:
+            self.remove(source_id)
+            return
+
+        prev_image = np.asarray(prev_image, dtype=np.uint8)
+        try:
+            if prev_image.nbytes > self.slot_size or prev_image.ndim > self.max_ndim:
+                raise PrevImageSlotError(f'previous image does not fit into a slot, shape: {prev_image.shape}, slot size: {self.slot_size}')
+            self.__set_slot(source_id, prev_image)
+            self.dic.pop(source_id, None)
+        except PrevImageSlotError as err:
+            if source_id not in self.__warned:
+                self.__warned.add(source_id)
+                logger.warning(f'previous image of source({source_id}) is kept in the process memory, it is not shared by the other workers '
+                               f'(increase prev_image_max_width/height/channels or prev_image_slot_count), err: {err}')
+            self.dic[source_id] = prev_image
+
+    def __set_slot(self, source_id: str, prev_image: npt.NDArray):
+        key = self.__create_key(source_id)
+        if key is None:
+            raise PrevImageSlotError(f'source id is longer than {self.max_source_id_length} bytes')
+        for _ in range(2):  # the second one allocates again if the slot has been freed by another process
+            slot = self.__find_slot(source_id, key, True)
+            with self.slot_locks[slot]:
+                if not self.__is_owner(slot, key):
+                    self.__slots.pop(source_id, None)
+                    continue
+                dest = np.ndarray(prev_image.shape, dtype=np.uint8, buffer=self.__get_buffer(slot))
+                np.copyto(dest, prev_image)
+                shape = self.meta['shape'][slot]
+                shape[:] = 0
+                shape[:prev_image.ndim] = prev_image.shape
+                self.meta['ndim'][slot] = prev_image.ndim
+                self.meta['generation'][slot] += 1
+                return
+
+    # frees the slot of the source, so that it can be allocated for another one
+    def remove(self, source_id: str):
+        self.dic.pop(source_id, None)
+        self.__warned.discard(source_id)
+        self.__slots.pop(source_id, None)
+        key = self.__create_key(source_id)
+        if key is None:
+            return
+        with self.allocation_lock:
+            for slot in np.flatnonzero(self.meta['source_id'] == key):
+                with self.slot_locks[slot]:
+                    self.meta['source_id'][slot] = b''
+                    self.meta['ndim'][slot] = 0
+                    self.meta['generation'][slot] += 1
+
+    def close(self, unlink: bool):
+        self.meta = None
+        self.meta_memory.close()
+        self.data_memory.close()
+        if unlink:
+            self.meta_memory.unlink()
+            self.data_memory.unlink()
@@ -1,9 +1,12 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
 from redis.client import Redis
 
 from common.data.source_model import SourceModel
 from common.data.source_repository import SourceRepository
 from common.utilities import logger
+from core.data_changed.cache_generation import CacheGeneration
 
 
 class BaseCache(ABC):
@@ -19,9 +22,14 @@ class BaseCache(ABC):
     def remove(self, source_id: str):
         raise NotImplementedError('BaseCache.remove')
 
+    @abstractmethod
+    def warm_up(self, batch_size: int) -> int:
+        raise NotImplementedError('BaseCache.warm_up')
+
 
 class SourceCache(BaseCache):
     dic = {}
+    generation: CacheGeneration | None = None
 
     def __init__(self, connection: Redis):
         self.source_repository = SourceRepository(connection)
@@ -30,7 +38,15 @@ class SourceCache(BaseCache):
     def set_dict(dic: dict):
         SourceCache.dic = dic
 
+    @staticmethod
+    def set_generation(generation: CacheGeneration | None):
+        SourceCache.generation = generation
+        if generation is not None:
+            generation.register(SourceCache.dic)
+
     def get(self, source_id: str) -> SourceModel | None:
+        if SourceCache.generation is not None:
+            SourceCache.generation.validate()
         if source_id not in SourceCache.dic:
             source_model = self.source_repository.get(source_id)
             if source_model is None:
@@ -46,3 +62,9 @@ class SourceCache(BaseCache):
 
     def remove(self, source_id: str):
         SourceCache.dic[source_id] = None
+
+    def warm_up(self, batch_size: int) -> int:
+        models = self.source_repository.get_all(batch_size)
+        loaded = set(SourceCache.dic.keys())
+        SourceCache.dic.update({model.id: model for model in models if model.id not in loaded})  # a single round trip for the Manager dict
+        return len(models)
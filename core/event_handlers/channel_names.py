@@ -7,3 +7,4 @@ class EventChannels(str, Enum):
     snapshot_in = 'snapshot_in'
     snapshot_out = 'snapshot_out'
     od_service = 'od_service'
+    motion_events = 'motion_events'
@@ -1,5 +1,8 @@
+from __future__ import annotations
+
 import json
 from enum import IntEnum
+from typing import Callable
 from redis.client import Redis
 
 from common.event_bus.event_handler import EventHandler
@@ -28,14 +31,22 @@ class DataChangedEvent:
 
 
 class DataChangedEventHandler(EventHandler):
-    def __init__(self, connection: Redis, prev_image_cache: PrevImageCache):
+    # refresh_caches is not set for the workers which share the Manager dicts of the main process, it refreshes them once for all
+    # on_applied gets the id of the changed source
+    def __init__(self, connection: Redis, prev_image_cache: PrevImageCache, on_applied: Callable[[str], None] | None = None,
+                 refresh_caches: bool = True, on_subscribed: Callable | None = None):
         self.channel = EventChannels.data_changed
         self.encoding = 'utf-8'
         self.prev_image_cache = prev_image_cache
+        self.on_applied = on_applied
+        self.refresh_caches = refresh_caches
+        self.on_subscribed = on_subscribed
         self.source_cache = SourceCache(connection)
         self.od_cache = OdCache(connection, self.source_cache)
 
     def handle(self, dic: dict):
+        if dic is not None and dic['type'] == 'subscribe' and self.on_subscribed is not None:
+            self.on_subscribed()
         if dic is None or dic['type'] != 'message':
             return
 
@@ -49,6 +60,14 @@ class DataChangedEventHandler(EventHandler):
         dic = json.loads(event.params_json)
         mc.__dict__.update(dic)
 
+        if self.refresh_caches:
+            self.__refresh_caches(event, mc)
+
+        self.prev_image_cache.remove(mc.source_id)
+        if self.on_applied is not None:
+            self.on_applied(mc.source_id)
+
+    def __refresh_caches(self, event: DataChangedEvent, mc: ModelChanged):
         if event.model_name == 'source':
             if event.op == ModelChangedOp.SAVE:
                 self.source_cache.refresh(mc.source_id)
@@ -68,5 +87,3 @@ class DataChangedEventHandler(EventHandler):
                 logger.warning('Od Cache has been removed')
             else:
                 raise NotImplementedError(event.op)
-
-        self.prev_image_cache.set(mc.source_id, None)
@@ -0,0 +1,63 @@
+import time
+from typing import Dict
+
+from common.utilities import logger
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens: float = burst
+        self.last_time: float = time.monotonic()
+        self.forwarded_count: int = 0
+        self.dropped_count: int = 0
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.last_time) * self.rate)
+        self.last_time = now
+        if self.tokens < 1.:
+            self.dropped_count += 1
+            return False
+        self.tokens -= 1.
+        self.forwarded_count += 1
+        return True
+
+
+# caps the frames per second which a source can forward to snapshot_in, so that a single busy camera can not starve object detection for
+# the others. The excess frames are only counted. Every pool worker has its own buckets, so the rate is divided by the worker count then,
+# which approximates the rate only as long as the frames of a source are spread evenly over the workers (see SnapshotConfig.forward_rate)
+class ForwardRateLimiter:
+    def __init__(self, rate: float, burst: float, divisor: int, report_interval: int):
+        self.rate = rate
+        self.burst = burst
+        self.divisor = max(divisor, 1)
+        self.report_interval = report_interval
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.last_report_time: float = time.monotonic()
+
+    # source_rate overrides the global rate if it is not negative, 0 means no limit
+    def allow(self, source_id: str, source_rate: float) -> bool:
+        rate = source_rate if source_rate >= 0. else self.rate
+        if rate <= 0.:
+            return True
+        rate /= self.divisor
+        now = time.monotonic()
+        bucket = self.buckets.get(source_id)
+        if bucket is None or bucket.rate != rate:
+            bucket = TokenBucket(rate, max(self.burst / self.divisor, 1.))
+            self.buckets[source_id] = bucket
+        ret = bucket.take(now)
+        if 0 < self.report_interval <= now - self.last_report_time:
+            self.last_report_time = now
+            self.__report()
+        return ret
+
+    def get_stats(self) -> dict:
+        return {source_id: {'forwarded_count': bucket.forwarded_count, 'dropped_count': bucket.dropped_count}
+                for source_id, bucket in self.buckets.items()}
+
+    def __report(self):
+        for source_id, stats in self.get_stats().items():
+            if stats['dropped_count'] > 0:
+                logger.warning(f'source({source_id}) forward rate limit, forwarded: {stats["forwarded_count"]}, dropped: {stats["dropped_count"]}')
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import time
+from threading import Lock
+from typing import Dict
+
+from common.utilities import logger
+from core.data_changed.source_cache import SourceCache
+
+
+class AdmissionStats:
+    def __init__(self):
+        self.admitted_count: int = 0
+        self.dropped_count: int = 0
+        self.last_time: float = 0.  # of the last admitted frame
+
+
+# drops the frames which arrive faster than snapshot_frame_rate of their source (or max_fps if it is lower) before they are decoded or sent to
+# a worker, so a misbehaving reader can not flood the motion detection. tolerance is the fraction of the frame interval which is accepted, for
+# the jitter of the readers
+class FrameAdmission:
+    # the rates of the sources are not used without source_cache, only max_fps is
+    def __init__(self, source_cache: SourceCache | None, tolerance: float, report_interval: int, max_fps: float = 0.):
+        self.source_cache = source_cache
+        self.tolerance = tolerance
+        self.max_fps = max_fps  # 0 means no limit
+        self.report_interval = report_interval
+        self.stats: Dict[str, AdmissionStats] = {}
+        # the rates are read from the source cache once per source instead of once per frame (a Manager dict call), remove() drops the
+        # rate of a source which has changed
+        self.rates: Dict[str, float] = {}
+        self.last_report_time: float = time.monotonic()
+        self.__lock = Lock()
+
+    def get_rate(self, source_id: str) -> float:
+        rate = self.rates.get(source_id)
+        if rate is None:
+            rate = self.__read_rate(source_id)
+            self.rates[source_id] = rate
+        return rate
+
+    def __read_rate(self, source_id: str) -> float:
+        source_model = self.source_cache.get(source_id) if self.source_cache is not None else None
+        rate = source_model.snapshot_frame_rate if source_model is not None and source_model.snapshot_frame_rate > 0 else 0.
+        if self.max_fps > 0.:
+            rate = min(rate, self.max_fps) if rate > 0. else self.max_fps
+        return rate
+
+    def admit(self, source_id: str) -> bool:
+        rate = self.get_rate(source_id)
+        if rate <= 0.:
+            return True
+        min_interval = self.tolerance / rate
+        now = time.monotonic()
+        with self.__lock:
+            stats = self.stats.get(source_id)
+            if stats is None:
+                stats = AdmissionStats()
+                self.stats[source_id] = stats
+            if now - stats.last_time < min_interval:
+                stats.dropped_count += 1
+                ret = False
+            else:
+                stats.last_time = now
+                stats.admitted_count += 1
+                ret = True
+            report = 0 < self.report_interval <= now - self.last_report_time
+            if report:
+                self.last_report_time = now
+        if report:
+            self.__report()
+        return ret
+
+    def remove(self, source_id: str):
+        self.rates.pop(source_id, None)
+
+    def get_stats(self) -> dict:
+        with self.__lock:
+            return {source_id: {'admitted_count': stats.admitted_count, 'dropped_count': stats.dropped_count} for source_id, stats in self.stats.items()}
+
+    def __report(self):
+        for source_id, stats in self.get_stats().items():
+            if stats['dropped_count'] > 0:
+                logger.warning(f'source({source_id}) exceeds its snapshot frame rate, admitted: {stats["admitted_count"]}, dropped: {stats["dropped_count"]}')
@@ -0,0 +1,91 @@
+import time
+from collections import deque
+from threading import Thread, Condition
+from typing import Callable, Dict, Tuple, Any
+
+from common.utilities import logger
+
+
+class CoalesceStats:
+    def __init__(self):
+        self.received_count: int = 0
+        self.coalesced_count: int = 0  # pending frames which were replaced by a newer one
+        self.dropped_count: int = 0  # frames which became too old before a worker was free or were not accepted
+        self.forwarded_count: int = 0
+
+
+# keeps at most one pending frame per source, so a slow consumer gets the freshest frame of every camera instead of a backlog. fn has to block
+# until the consumer has capacity, and return False if it has not accepted the frame
+class FrameCoalescer:
+    def __init__(self, fn: Callable, max_age: float, report_interval: int, on_drop: Callable | None = None):
+        self.fn = fn
+        self.on_drop = on_drop  # called with the replaced and the too old items
+        self.max_age = max_age
+        self.report_interval = report_interval
+        self.stats: Dict[str, CoalesceStats] = {}
+        self.__pending: Dict[str, Tuple[float, Any]] = {}
+        self.__ready = deque()
+        self.__cond = Condition()
+
+    def start(self):
+        th = Thread(target=self.__loop, name='frame-coalescer')
+        th.daemon = True
+        th.start()
+        if self.report_interval > 0:
+            th = Thread(target=self.__report_loop, name='frame-coalescer-report')
+            th.daemon = True
+            th.start()
+
+    def put(self, source_id: str, item):
+        replaced = None
+        with self.__cond:
+            stats = self.stats.get(source_id)
+            if stats is None:
+                stats = CoalesceStats()
+                self.stats[source_id] = stats
+            stats.received_count += 1
+            if source_id in self.__pending:
+                stats.coalesced_count += 1
+                replaced = self.__pending[source_id][1]
+            else:
+                self.__ready.append(source_id)
+            self.__pending[source_id] = (time.monotonic(), item)
+            self.__cond.notify()
+        if replaced is not None and self.on_drop is not None:
+            self.on_drop(replaced)
+
+    def get_stats(self) -> dict:
+        with self.__cond:
+            return {source_id: dict(stats.__dict__) for source_id, stats in self.stats.items()}
+
+    def __loop(self):
+        while True:
+            with self.__cond:
+                while len(self.__ready) == 0:
+                    self.__cond.wait()
+                source_id = self.__ready.popleft()
+                received_at, item = self.__pending.pop(source_id)
+                stats = self.stats[source_id]
+            if 0. < self.max_age < time.monotonic() - received_at:
+                with self.__cond:
+                    stats.dropped_count += 1
+                if self.on_drop is not None:
+                    self.on_drop(item)
+                continue
+            try:
+                accepted = self.fn(source_id, item)
+                with self.__cond:
+                    if accepted:
+                        stats.forwarded_count += 1
+                    else:
+                        stats.dropped_count += 1
+            except BaseException as ex:
+                logger.error(f'an error occurred while forwarding a coalesced frame for source({source_id}), ex: {ex}')
+
+    def __report_loop(self):
+        while True:
+            time.sleep(self.report_interval)
+            for source_id, stats in self.get_stats().items():
+                if stats['coalesced_count'] > 0 or stats['dropped_count'] > 0:
+                    logger.warning(f'source({source_id}) frame coalescing, received: {stats["received_count"]}, coalesced: {stats["coalesced_count"]}, '
+                                   f'dropped: {stats["dropped_count"]}, forwarded: {stats["forwarded_count"]}')
@@ -1,48 +1,170 @@
 import os
 from multiprocessing import Pool
+from threading import BoundedSemaphore
+from typing import Callable
 
+from common.data.filter_stats_repository import FilterStatsRepository
+from core.data_changed.cache_generation import CacheGeneration
 from core.data_changed.od.od_cache import OdCache
 from core.data_changed.prev_image_cache import PrevImageCache
 from core.data_changed.source_cache import SourceCache
-from common.event_bus.event_bus import EventBus
-from common.event_bus.event_handler import EventHandler
-from common.utilities import config, crate_redis_connection, RedisDb
+from common.config import DispatchMode
+from common.event_bus.event_handler import EventHandler, ack_event
+from common.utilities import config, crate_redis_connection, RedisDb, logger
 from core.event_handlers.channel_names import EventChannels
+from core.event_handlers.forward_rate_limiter import ForwardRateLimiter
+from core.event_handlers.frame_admission import FrameAdmission
+from core.event_handlers.frame_coalescer import FrameCoalescer
+from core.event_handlers.sharded_pool import ShardedPool
 from core.filters.in_filters import InFilters
+from core.filters.messages import InMessage
+from core.filters.roi_frame_store import RoiFrameStore
+from core.utilities import create_event_bus, listen_data_changed_event_in_worker
 
-_publisher = EventBus(EventChannels.snapshot_in)
+_publisher = create_event_bus(EventChannels.snapshot_in)
 _main_connection = crate_redis_connection(RedisDb.MAIN)
 _source_cache = SourceCache(_main_connection)
 _od_cache = OdCache(_main_connection, _source_cache)
-_in_filters = InFilters(_od_cache)
+_motion_event_publisher = create_event_bus(EventChannels.motion_events)
+_in_filters = InFilters(_od_cache, _motion_event_publisher.publish, FilterStatsRepository(_main_connection))
+_forward_rate_limiter: ForwardRateLimiter | None = None
+_roi_frame_store = RoiFrameStore(_main_connection, config.snapshot.roi_crop_frame_ttl)
 
 
 # noinspection DuplicatedCode
 class InFilterEventHandler(EventHandler):
-    def __init__(self, prev_image_cache: PrevImageCache, source_cache_dic: dict, od_cache_dic: dict):
+    # the admission is created by the main process once, its data_changed listener drops the cached rates of the changed sources
+    def __init__(self, prev_image_cache: PrevImageCache, source_cache_dic: dict, od_cache_dic: dict, cache_generation: CacheGeneration | None = None,
+                 admission: FrameAdmission | None = None):
         self.pool: Pool = None  # Pool(4)  # None
+        self.sharded_pool: ShardedPool | None = None
+        self.in_flight: BoundedSemaphore | None = None
+        self.coalescer: FrameCoalescer | None = None
+        self.admission = admission
         _in_filters.set_prev_image_cache(prev_image_cache)
         _source_cache.set_dict(source_cache_dic)
         _od_cache.set_dict(od_cache_dic)
+        _source_cache.set_generation(cache_generation)
+        _od_cache.set_generation(cache_generation)
 
     def __enter__(self):
-        self.pool = Pool(config.snapshot.process_count if config.snapshot.process_count > 0 else os.cpu_count())
+        process_count = config.snapshot.process_count if config.snapshot.process_count > 0 else os.cpu_count()
+        if config.snapshot.dispatch_mode == DispatchMode.SourceAffinity:
+            self.sharded_pool = ShardedPool(process_count, config.snapshot.shard_queue_size, _init_shard_worker)
+            self.sharded_pool.start()
+        else:
+            self.pool = Pool(process_count, initializer=_init_pool_worker, initargs=(process_count,))
+        if self.pool is not None and (config.snapshot.dispatcher_enabled or config.snapshot.coalescing_enabled):
+            # Pool's own task queue is unbounded, dispatcher/coalescer threads wait here, so the backpressure reaches to their queues
+            max_in_flight = config.snapshot.dispatcher_max_in_flight
+            self.in_flight = BoundedSemaphore(max_in_flight if max_in_flight > 0 else process_count * 2)
+        if config.snapshot.coalescing_enabled:
+            self.coalescer = FrameCoalescer(self.__dispatch, config.snapshot.coalescing_max_age, config.snapshot.coalescing_report_interval,
+                                            ack_event)
+            self.coalescer.start()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.pool is not None:
             self.pool.close()
             self.pool.join()
+        if self.sharded_pool is not None:
+            self.sharded_pool.close()
+            self.sharded_pool.join()
         return self
 
     def handle(self, dic: dict):
         if dic is None or dic['type'] != 'message':
             return
 
-        self.pool.apply_async(_handle, args=(dic,))
+        source_id = ''
+        if self.coalescer is not None or self.sharded_pool is not None or self.admission is not None:
+            try:
+                source_id = InMessage.peek_source_id(dic)
+            except BaseException as ex:
+                logger.error(f'an error occurred while reading the source id of a frame, ex: {ex}')
+                ack_event(dic)
+                return
+
+        if self.admission is not None and not self.admission.admit(source_id):
+            ack_event(dic)
+            return
+
+        if self.coalescer is not None:
+            self.coalescer.put(source_id, dic)
+            return
+
+        self.__dispatch(source_id, dic)
+
+    # the ack of a stream entry can not be pickled, it is called here once the worker has finished the frame. The coalescer waits here until
+    # the shard or the pool has capacity, so that it keeps replacing the pending frames with the latest ones meanwhile. Returns False if the
+    # frame has not been accepted
+    def __dispatch(self, source_id: str, dic: dict) -> bool:
+        ack = dic.pop('ack', None)
+        if self.sharded_pool is not None:
+            return self.sharded_pool.apply_async(source_id, _handle, args=(dic,), callback=ack, block=self.coalescer is not None)
+
+        if self.in_flight is not None:
+            self.in_flight.acquire()
+        done = self.__create_done(ack)
+        try:
+            self.pool.apply_async(_handle, args=(dic,), callback=done, error_callback=done)
+            return True
+        except BaseException:
+            if self.in_flight is not None:
+                self.in_flight.release()
+            raise
+
+    # Pool passes the exception of a failed task to error_callback, it is logged here since nothing else sees it
+    def __create_done(self, ack: Callable | None) -> Callable:
+        def fn(ret):
+            if self.in_flight is not None:
+                self.in_flight.release()
+            if isinstance(ret, BaseException):
+                logger.error(f'an error occurred while handling a frame, ex: {ret}')
+            if ack is not None:
+                ack()
+        return fn
+
+
+# in_max_fps is the only limit without the admission, so the rates of the sources are not read then
+def create_frame_admission() -> FrameAdmission | None:
+    snapshot_config = config.snapshot
+    if snapshot_config.admission_enabled:
+        return FrameAdmission(_source_cache, snapshot_config.admission_tolerance, snapshot_config.admission_report_interval,
+                              snapshot_config.in_max_fps)
+    if snapshot_config.in_max_fps > 0.:
+        return FrameAdmission(None, 1., snapshot_config.admission_report_interval, snapshot_config.in_max_fps)
+    return None
+
+
+def _init_forward_rate_limiter(divisor: int):
+    global _forward_rate_limiter
+    snapshot_config = config.snapshot
+    _forward_rate_limiter = ForwardRateLimiter(snapshot_config.forward_rate, snapshot_config.forward_burst, divisor,
+                                               snapshot_config.forward_report_interval)
+
+
+def _init_pool_worker(process_count: int):
+    _init_forward_rate_limiter(process_count)  # any worker can get any frame of a source
+    listen_data_changed_event_in_worker(_main_connection, _in_filters.prev_image_cache, False)
+
+
+# the previous images live in the shard worker which owns the source, so each worker resets its own ones on data_changed
+def _init_shard_worker():
+    _init_forward_rate_limiter(1)
+    _in_filters.set_prev_image_cache(PrevImageCache({}))
+    listen_data_changed_event_in_worker(_main_connection, _in_filters.prev_image_cache, True)
 
 
 def _handle(dic: dict):
     in_message = _in_filters.ok(dic)
-    if in_message is not None:
+    if in_message is None:
+        return
+    if _forward_rate_limiter is not None and not _forward_rate_limiter.allow(in_message.source_id, in_message.source_model.snapshot_forward_rate):
+        return
+    if config.snapshot.roi_crop_enabled:
+        for data in in_message.create_roi_publish_list(_roi_frame_store):
+            _publisher.publish(data)
+    else:
         _publisher.publish(in_message.create_publish_dic())
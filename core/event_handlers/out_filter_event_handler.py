@@ -1,28 +1,43 @@
 import os
 from multiprocessing import Pool
+from threading import BoundedSemaphore
+from typing import Callable
 
+from common.data.filter_stats_repository import FilterStatsRepository
 from common.event_bus.event_handler import EventHandler
-from common.utilities import crate_redis_connection, RedisDb, config
+from common.utilities import crate_redis_connection, RedisDb, config, logger
+from core.data_changed.cache_generation import CacheGeneration
 from core.data_changed.od.od_cache import OdCache
+from core.data_changed.prev_image_cache import PrevImageCache
 from core.data_changed.source_cache import SourceCache
 from core.filters.out_filters import OutFilters
+from core.filters.roi_frame_store import RoiFrameStore
+from core.utilities import listen_data_changed_event_in_worker
 
 _main_connection = crate_redis_connection(RedisDb.MAIN)
 _event_bus_connection = crate_redis_connection(RedisDb.EVENTBUS)
 _source_cache = SourceCache(_main_connection)
 _od_cache = OdCache(_main_connection, _source_cache)
-_out_filters = OutFilters(_od_cache)
+_out_filters = OutFilters(_od_cache, RoiFrameStore(_main_connection, config.snapshot.roi_crop_frame_ttl), FilterStatsRepository(_main_connection))
 
 
 # noinspection DuplicatedCode
 class OutFilterEventHandler(EventHandler):
-    def __init__(self, source_cache_dic: dict, od_cache_dic: dict):
+    def __init__(self, source_cache_dic: dict, od_cache_dic: dict, cache_generation: CacheGeneration | None = None):
         self.pool: Pool = None  # Pool(4)  # None
+        self.in_flight: BoundedSemaphore | None = None
         _source_cache.set_dict(source_cache_dic)
         _od_cache.set_dict(od_cache_dic)
+        _source_cache.set_generation(cache_generation)
+        _od_cache.set_generation(cache_generation)
 
     def __enter__(self):
-        self.pool = Pool(config.snapshot.process_count if config.snapshot.process_count > 0 else os.cpu_count())
+        process_count = config.snapshot.process_count if config.snapshot.process_count > 0 else os.cpu_count()
+        self.pool = Pool(process_count, initializer=_init_pool_worker)
+        if config.snapshot.dispatcher_enabled:
+            # Pool's own task queue is unbounded, dispatcher threads wait here, so the backpressure reaches to the dispatcher queue
+            max_in_flight = config.snapshot.dispatcher_max_in_flight
+            self.in_flight = BoundedSemaphore(max_in_flight if max_in_flight > 0 else process_count * 2)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -35,7 +50,32 @@ class OutFilterEventHandler(EventHandler):
         if dic is None or dic['type'] != 'message':
             return
 
-        self.pool.apply_async(_handle, args=(dic,))
+        # the ack of a stream entry can not be pickled, it is called here once the worker has finished the message
+        ack = dic.pop('ack', None)
+        if self.in_flight is not None:
+            self.in_flight.acquire()
+        done = self.__create_done(ack)
+        try:
+            self.pool.apply_async(_handle, args=(dic,), callback=done, error_callback=done)
+        except BaseException:
+            if self.in_flight is not None:
+                self.in_flight.release()
+            raise
+
+    # Pool passes the exception of a failed task to error_callback, it is logged here since nothing else sees it
+    def __create_done(self, ack: Callable | None) -> Callable:
+        def fn(ret):
+            if self.in_flight is not None:
+                self.in_flight.release()
+            if isinstance(ret, BaseException):
+                logger.error(f'an error occurred while handling a message, ex: {ret}')
+            if ack is not None:
+                ack()
+        return fn
+
+
+def _init_pool_worker():
+    listen_data_changed_event_in_worker(_main_connection, PrevImageCache({}), False)
 
 
 def _handle(dic: dict):
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import itertools
+import time
+import zlib
+from multiprocessing import Process, Queue
+from threading import Thread, Condition
+from typing import Callable, List, Dict, Tuple
+
+from common.utilities import logger
+
+
+# routes every key to the same worker process by a stable hash, so the per-source state stays in that process. The frames of a source are
+# processed in the order they arrive only if a single thread calls apply_async, the subscriber of read_service does so in SourceAffinity mode.
+# At most capacity tasks of a shard are in its worker at once, the latest one which comes after that waits in the pending slot of the shard
+# and replaces the one which has been waiting there, so a slow shard always gets the freshest frame next instead of a backlog of stale ones.
+# A shard worker which has died is started again with the same index, the tasks which were in it are dropped
+class ShardedPool:
+    def __init__(self, process_count: int, capacity: int, initializer: Callable | None = None, check_interval: float = 1.):
+        self.process_count = process_count if process_count > 0 else 1
+        self.capacity = capacity if capacity > 0 else 1
+        self.initializer = initializer
+        self.queues: List[Queue] = []
+        self.processes: List[Process] = []
+        # the workers report the finished tasks back, so that the callbacks run in this process like the ones of Pool.apply_async
+        self.done_queue = Queue()
+        self.callbacks: Dict[int, Tuple[int, Callable]] = {}  # task id: (shard, callback)
+        self.epochs: List[int] = [0] * self.process_count  # increased on every restart, so that a late done of a dead worker is ignored
+        self.check_interval = check_interval
+        self.closed: bool = False
+        self.in_flight: List[int] = [0] * self.process_count
+        self.pending: List[Tuple[tuple, Callable | None] | None] = [None] * self.process_count
+        self.dropped_count: int = 0
+        self.__task_ids = itertools.count(1)
+        self.__cond = Condition()
+        self.__done_thread: Thread | None = None
+
+    def start(self):
+        for j in range(self.process_count):
+            self.queues.append(Queue())
+            self.processes.append(self.__start_process(j))
+        self.__done_thread = Thread(target=self.__done_loop, name='sharded-pool-done')
+        self.__done_thread.daemon = True
+        self.__done_thread.start()
+        th = Thread(target=self.__check_loop, name='sharded-pool-check')
+        th.daemon = True
+        th.start()
+
+    def __start_process(self, shard: int) -> Process:
+        process = Process(target=_worker_loop, args=(shard, self.epochs[shard], self.queues[shard], self.done_queue, self.initializer),
+                          name=f'shard-{shard}')
+        process.daemon = True
+        process.start()
+        return process
+
+    def __check_loop(self):
+        while not self.closed:
+            time.sleep(self.check_interval)
+            for shard, process in enumerate(self.processes):
+                if not self.closed and not process.is_alive():
+                    try:
+                        self.__restart(shard, process.exitcode)
+                    except BaseException as ex:
+                        logger.error(f'an error occurred while restarting shard-{shard}, ex: {ex}')
+
+    # the tasks which were in the dead worker never report back, their callbacks are called here as dropped ones
+    def __restart(self, shard: int, exitcode: int | None):
+        with self.__cond:
+            if self.closed:
+                return
+            self.epochs[shard] += 1
+            dropped = [task_id for task_id, item in self.callbacks.items() if item[0] == shard]
+            callbacks = [self.callbacks.pop(task_id)[1] for task_id in dropped]
+            self.dropped_count += self.in_flight[shard]
+            logger.error(f'shard-{shard} has died (exit code: {exitcode}), {self.in_flight[shard]} of its tasks have been dropped, '
+                         f'it is being restarted')
+            self.in_flight[shard] = 0
+            self.queues[shard] = Queue()
+            self.processes[shard] = self.__start_process(shard)
+            pending = self.pending[shard]
+            if pending is not None:
+                self.pending[shard] = None
+                self.in_flight[shard] += 1
+                self.__put(shard, pending[0], pending[1])
+            self.__cond.notify_all()
+        for callback in callbacks:
+            self.__call(callback)
+
+    def __done_loop(self):
+        while True:
+            item = self.done_queue.get()
+            if item is None:
+                break
+            shard, epoch, task_id = item
+            with self.__cond:
+                if epoch != self.epochs[shard]:
+                    continue
+                item = self.callbacks.pop(task_id, None)
+                callback = item[1] if item is not None else None
+                # the pending task takes the place of the finished one
+                pending = self.pending[shard]
+                if pending is not None:
+                    self.pending[shard] = None
+                    self.__put(shard, pending[0], pending[1])
+                else:
+                    self.in_flight[shard] -= 1
+                self.__cond.notify_all()
+            self.__call(callback)
+
+    @staticmethod
+    def __call(callback: Callable | None):
+        if callback is None:
+            return
+        try:
+            callback()
+        except BaseException as ex:
+            logger.error(f'an error occurred in a sharded pool callback, ex: {ex}')
+
+    def get_shard(self, key: str) -> int:
+        return zlib.crc32(key.encode('utf-8')) % self.process_count
+
+    # called with the lock held
+    def __put(self, shard: int, task: tuple, callback: Callable | None):
+        if callback is not None:
+            self.callbacks[task[0]] = (shard, callback)
+        self.queues[shard].put(task)
+
+    # does not block unless block is set, so a busy shard does not stall the routing of the others. With block, it waits until the shard has
+    # capacity, e.g. for a coalescer which keeps the latest frame meanwhile, and returns False if the pool has been closed. callback is called
+    # once the task has finished or it has been dropped
+    def apply_async(self, key: str, fn: Callable, args=(), callback: Callable | None = None, block: bool = False) -> bool:
+        shard = self.get_shard(key)
+        task = (next(self.__task_ids), fn, args)
+        with self.__cond:
+            while block and not self.closed and self.in_flight[shard] >= self.capacity:
+                self.__cond.wait()
+            closed = self.closed
+            if not closed and self.in_flight[shard] < self.capacity:
+                self.in_flight[shard] += 1
+                self.__put(shard, task, callback)
+                return True
+            replaced = None
+            if not closed:
+                replaced = self.pending[shard]
+                self.pending[shard] = (task, callback)
+            if closed or replaced is not None:
+                self.dropped_count += 1
+                dropped_count = self.dropped_count
+        if closed:
+            self.__call(callback)
+            return False
+        if replaced is not None:
+            if dropped_count % 1000 == 1:
+                logger.warning(f'shard-{shard} is busy, its pending task has been replaced by a newer one, total dropped task count: {dropped_count}')
+            self.__call(replaced[1])
+        return True
+
+    def close(self):
+        with self.__cond:
+            self.closed = True
+            self.__cond.notify_all()
+        for queue in self.queues:
+            queue.put(None)
+
+    def join(self):
+        for process in self.processes:
+            process.join()
+        self.done_queue.put(None)
+        if self.__done_thread is not None:
+            self.__done_thread.join()
+
+
+def _worker_loop(shard: int, epoch: int, queue: Queue, done_queue: Queue, initializer: Callable | None):
+    if initializer is not None:
+        initializer()
+    while True:
+        task = queue.get()
+        if task is None:
+            break
+        task_id, fn, args = task
+        try:
+            fn(*args)
+        except BaseException as ex:
+            logger.error(f'an error occurred in a shard worker, ex: {ex}')
+        finally:
+            done_queue.put((shard, epoch, task_id))
@@ -1,3 +1,6 @@
+import math
+
+
 class DetectionBox:
     def __init__(self):
         self.x1: int = 0
@@ -5,6 +8,12 @@ class DetectionBox:
         self.x2: int = 0
         self.y2: int = 0
 
+    # maps the box of a reduced frame onto the frame which is fx and fy times larger. It is rounded outwards, so that it still covers the
+    # whole motion, and clamped to the width and height of that frame
+    def scale(self, fx: float, fy: float, width: int, height: int):
+        self.x1, self.y1 = max(math.floor(self.x1 * fx), 0), max(math.floor(self.y1 * fy), 0)
+        self.x2, self.y2 = min(math.ceil(self.x2 * fx), width), min(math.ceil(self.y2 * fy), height)
+
 
 class DetectionResult:
     def __init__(self):
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from typing import List, Dict
+
+from common.data.filter_stats_repository import FilterStatsRepository
+from common.utilities import logger
+from core.filters.filters import Filter
+from core.filters.messages import InMessage
+
+
+class StageStats:
+    def __init__(self, window: int):
+        self.costs = deque(maxlen=window)
+        self.rejections = deque(maxlen=window)
+
+    def add(self, cost: float, rejected: bool):
+        self.costs.append(cost)
+        self.rejections.append(1 if rejected else 0)
+
+    def get_mean_cost(self) -> float:
+        return sum(self.costs) / len(self.costs) if len(self.costs) > 0 else 0.
+
+    def get_rejection_rate(self) -> float:
+        return sum(self.rejections) / len(self.rejections) if len(self.rejections) > 0 else 0.
+
+    # a stage with a lower cost per rejection should run earlier, this order minimizes the expected cost of the independent stages
+    def get_rank(self) -> float:
+        rejection_rate = self.get_rejection_rate()
+        return self.get_mean_cost() / rejection_rate if rejection_rate > 0. else float('inf')
+
+
+class SourceChainStats:
+    def __init__(self, stages: List[Filter], window: int):
+        self.order: List[Filter] = list(stages)
+        self.stats: Dict[str, StageStats] = {stage.name: StageStats(window) for stage in stages}
+        self.frame_count: int = 0
+
+
+# runs the stages ordered by what they need from a frame, so that the header only stages reject a frame before any base64 or JPEG work.
+# the stages which need the same input keep the given order unless the adaptive ordering is enabled, then the independent stages of the
+# same input are reordered per source by their measured cost and rejection rate. The stats live in the worker process which runs the chain,
+# so each worker logs its own ones every report_interval seconds and writes them to redis if a stats repository is given
+class FilterChain:
+    def __init__(self, stages: List[Filter], adaptive: bool = False, window: int = 100, reorder_interval: int = 50, name: str = 'filter chain',
+                 report_interval: int = 0, stats_repository: FilterStatsRepository | None = None):
+        self.stages: List[Filter] = sorted(stages, key=lambda stage: stage.required_input)
+        self.adaptive = adaptive
+        self.window = window
+        self.reorder_interval = reorder_interval
+        self.name = name
+        self.report_interval = report_interval  # seconds, 0 means never
+        self.stats_repository = stats_repository
+        self.sources: Dict[str, SourceChainStats] = {}
+        self.last_report_time: float = time.monotonic()
+
+    # returns the stage which has rejected the message, None if all of them are ok
+    def run(self, message: InMessage) -> Filter | None:
+        if self.adaptive:
+            return self.__run_adaptive(message)
+        for stage in self.stages:
+            if not stage.ok(message):
+                logger.warning(f'{stage.name} is not ok for source({message.source_id})')
+                return stage
+        return None
+
+    def __run_adaptive(self, message: InMessage) -> Filter | None:
+        source_stats = self.sources.get(message.source_id)
+        if source_stats is None:
+            source_stats = SourceChainStats(self.stages, self.window)
+            self.sources[message.source_id] = source_stats
+        source_stats.frame_count += 1
+        ret = None
+        for stage in source_stats.order:
+            start = time.perf_counter()
+            ok = stage.ok(message)
+            source_stats.stats[stage.name].add(time.perf_counter() - start, not ok)
+            if not ok:
+                logger.warning(f'{stage.name} is not ok for source({message.source_id})')
+                ret = stage
+                break
+        if source_stats.frame_count % self.reorder_interval == 0:
+            self.__reorder(message.source_id, source_stats)
+        now = time.monotonic()
+        if 0 < self.report_interval <= now - self.last_report_time:
+            self.last_report_time = now
+            self.__report()
+        return ret
+
+    def __reorder(self, source_id: str, source_stats: SourceChainStats):
+        order = list(source_stats.order)
+        # only the independent stages of the same input swap places, the others keep their positions
+        for required_input in set(stage.required_input for stage in order):
+            positions = [j for j, stage in enumerate(order) if stage.required_input == required_input and stage.independent]
+            ranked = sorted((order[j] for j in positions), key=lambda stage: source_stats.stats[stage.name].get_rank())
+            for j, stage in zip(positions, ranked):
+                order[j] = stage
+        if order != source_stats.order:
+            logger.info(f'filter order of source({source_id}) has been changed to {[stage.name for stage in order]}')
+            source_stats.order = order
+
+    def __report(self):
+        pid = os.getpid()
+        all_stats = self.get_stats()
+        if self.stats_repository is not None:
+            self.stats_repository.set(self.name, all_stats, self.report_interval * 3)
+        for source_id, source_stats in all_stats.items():
+            stages = ', '.join(f'{name}: {stats["mean_cost"] * 1000.:.2f} ms, {stats["rejection_rate"]:.0%} rejected'
+                               for name, stats in source_stats['stages'].items())
+            logger.warning(f'{self.name} stats of source({source_id}) in process {pid}, order: {source_stats["order"]}, {stages}')
+
+    def get_stats(self) -> dict:
+        ret = {}
+        for source_id, source_stats in self.sources.items():
+            ret[source_id] = {
+                'order': [stage.name for stage in source_stats.order],
+                'stages': {name: {'mean_cost': stats.get_mean_cost(), 'rejection_rate': stats.get_rejection_rate(), 'count': len(stats.costs)}
+                           for name, stats in source_stats.stats.items()}
+            }
+        return ret
@@ -1,19 +1,32 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
+from enum import IntEnum
 from typing import List
 
-from common.data.source_model import MotionDetectionType, SourceModel
-from common.utilities import logger
+from common.data.source_model import MotionDetectionType
+from common.utilities import logger, config
 from core.data_changed.od.od_cache import OdCache
-from core.data_changed.prev_image_cache import PrevImageCache
 from core.filters.messages import InMessage, OutMessage
-from core.filters.detections import DetectionBox, DetectionResult
+from core.filters.detections import DetectionResult
 from core.motion_detector.base_motion_detector import BaseMotionDetector
-from core.motion_detector.imagehash_detector import ImageHashDetector
-from core.motion_detector.opencv_detector import OpenCVDetector
-from core.motion_detector.psnr_detector import PsnrDetector
+from core.motion_detector.box_post_processor import BoxPostProcessor
+from core.motion_detector.motion_detector_registry import MotionDetectorRegistry
+from core.motion_detector.motion_pre_check import MotionPreCheck
+
+
+# what a filter needs from a frame, the filter chain runs the cheaper ones first
+class FilterInput(IntEnum):
+    Header = 0
+    Pixels = 1
+    Detections = 2
 
 
 class Filter(ABC):
+    name = 'filter'
+    required_input = FilterInput.Header
+    independent = True  # False if a later stage uses what this one sets on the message, it is never reordered then
+
     def __init__(self, od_cache: OdCache):
         self.od_cache = od_cache
         self.source_cache = od_cache.source_cache
@@ -23,7 +36,37 @@ class Filter(ABC):
         raise NotImplementedError('Filter.ok')
 
 
+class FrameFilter(Filter):
+    name = 'frame filter'
+
+    def __init__(self, od_cache: OdCache):
+        super().__init__(od_cache)
+
+    def ok(self, message: InMessage) -> bool:
+        if not message.is_valid():
+            logger.error(f'a snapshot image is not valid for source({message.source_id})')
+            return False
+        return True
+
+
+class SourceFilter(Filter):
+    name = 'source filter'
+    independent = False
+
+    def __init__(self, od_cache: OdCache):
+        super().__init__(od_cache)
+
+    def ok(self, message: InMessage) -> bool:
+        message.source_model = self.source_cache.get(message.source_id)
+        if message.source_model is None:
+            logger.error(f'source({message.source_id}) was not found in filters operation')
+            return False
+        return True
+
+
 class TimeFilter(Filter):
+    name = 'time filter'
+
     def __init__(self, od_cache: OdCache):
         super().__init__(od_cache)
 
@@ -38,72 +81,128 @@ class TimeFilter(Filter):
 
 
 class MotionDetectionFilter(Filter):
-    def __init__(self, od_cache: OdCache, source_model: SourceModel, prev_img_cache: PrevImageCache):
+    name = 'motion detection filter'
+    required_input = FilterInput.Pixels
+    independent = False
+
+    def __init__(self, od_cache: OdCache, registry: MotionDetectorRegistry):
         super().__init__(od_cache)
-        self.__source_model = source_model
-        self.__prev_img_cache = prev_img_cache
-        self.__detection_boxes: List[DetectionBox] = []
-
-    def _create_motion_detector(self, source_model: SourceModel) -> BaseMotionDetector | None:
-        if source_model.md_type == MotionDetectionType.OpenCV:
-            return OpenCVDetector(source_model, self.__prev_img_cache)
-        elif source_model.md_type == MotionDetectionType.ImageHash:
-            return ImageHashDetector(source_model, self.__prev_img_cache)
-        elif source_model.md_type == MotionDetectionType.Psnr:
-            return PsnrDetector(source_model, self.__prev_img_cache)
-        else:
-            logger.warning(f'Motion Detection Type was not found for source({source_model.id})')
-            return None
+        self.__registry = registry
+        self.__pre_check = MotionPreCheck(config.snapshot.md_pre_check_threshold)
+        self.__box_post_processor = BoxPostProcessor(config.snapshot) if config.snapshot.md_box_post_processing_enabled else None
 
     def ok(self, message: InMessage) -> bool:
-        if self.__source_model.md_type == MotionDetectionType.NoMotionDetection:
+        source_model = message.source_model
+        if source_model.md_type == MotionDetectionType.NoMotionDetection:
             return True
 
-        md: BaseMotionDetector | None = self._create_motion_detector(self.__source_model)
+        md: BaseMotionDetector | None = self.__registry.get(source_model)
         if md is None:
             return False
 
-        ret = md.has_motion(message.np_img)
-        self.__detection_boxes = ret.detection_boxes
+        pre_check_img = None
+        if config.snapshot.md_pre_check_enabled:
+            pre_check_img = message.create_analysis_img(MotionPreCheck.decode_scale)
+            if pre_check_img[0] is not None and not self.__pre_check.is_changed(md, pre_check_img[0]):
+                logger.info(f'motion pre-check (camera {source_model.id}) did not detect any change')
+                message.detection_boxes = []
+                return False
+
+        scale = source_model.md_analysis_scale
+        if scale > 1:
+            if pre_check_img is not None and scale == MotionPreCheck.decode_scale:  # already decoded at that scale
+                analysis_img, fx, fy = pre_check_img
+            else:
+                analysis_img, fx, fy = message.create_analysis_img(scale)
+            if analysis_img is None:
+                return False
+            self.__set_pixel_mask(message, md, analysis_img)
+            ret = md.has_motion(analysis_img)
+            width, height = round(analysis_img.shape[1] * fx), round(analysis_img.shape[0] * fy)
+            for box in ret.detection_boxes:  # back to the full resolution, so that the zone and mask filters work as before
+                box.scale(fx, fy, width, height)
+        else:
+            np_img = message.np_img
+            if np_img is None:
+                return False
+            self.__set_pixel_mask(message, md, np_img)
+            ret = md.has_motion(np_img)
+            height, width = np_img.shape[:2]
+        message.detection_boxes = ret.detection_boxes
+        # the frame size comes from the decoded image which has been checked above, not from pil_image which may have failed to decode
+        if self.__box_post_processor is not None and len(ret.detection_boxes) > 0:
+            message.detection_boxes = self.__box_post_processor.process(ret.detection_boxes, width, height)
+            if len(message.detection_boxes) == 0:
+                logger.info(f'all motion boxes of source({source_model.id}) are smaller than the minimum area')
+                return False
         return ret.has_motion
 
-    def get_detection_boxes(self) -> List[DetectionBox]:
-        return self.__detection_boxes
+    def __set_pixel_mask(self, message: InMessage, md: BaseMotionDetector, img):
+        source_model = message.source_model
+        if not source_model.md_pixel_mask_enabled or source_model.md_type != MotionDetectionType.OpenCV:
+            md.pixel_mask = None
+            return
+        od = self.od_cache.get(message.source_id)
+        if od is None:
+            md.pixel_mask = None
+            return
+        # the polygons are drawn on the snapshot resolution
+        height, width = img.shape[:2]
+        fx, fy = width / max(source_model.snapshot_width, 1), height / max(source_model.snapshot_height, 1)
+        md.pixel_mask = od.get_pixel_mask(width, height, fx, fy, source_model.md_pixel_mask_zones_only)
+        message.pixel_masked = md.pixel_mask is not None and source_model.md_pixel_mask_skip_filters
+
+
+def get_snapshot_size(message: InMessage) -> (int, int):
+    source_model = message.source_model
+    return (source_model.snapshot_width, source_model.snapshot_height) if source_model is not None else (0, 0)
 
 
 class ZoneFilter(Filter):
-    def __init__(self, od_cache: OdCache, boxes: List[DetectionBox]):
+    name = 'zone filter'
+    required_input = FilterInput.Detections
+
+    def __init__(self, od_cache: OdCache):
         super().__init__(od_cache)
-        self.boxes: List[DetectionBox] = boxes
 
     def ok(self, message: InMessage) -> bool:
+        if message.pixel_masked and message.source_model.md_pixel_mask_zones_only:
+            return True
         od = self.od_cache.get(message.source_id)
         if od is None:
             return True
-        for box in self.boxes:
-            if not od.is_in_zones(box):
-                logger.warning(f'a object which was detected by source({message.source_id}) was in the specified zone')
-                return False
+        width, height = get_snapshot_size(message)
+        if not od.get_in_zones_mask(message.get_detection_boxes(), width, height).all():
+            logger.warning(f'a object which was detected by source({message.source_id}) was in the specified zone')
+            return False
         return True
 
 
 class MaskFilter(Filter):
-    def __init__(self, od_cache: OdCache, boxes: List[DetectionBox]):
+    name = 'mask filter'
+    required_input = FilterInput.Detections
+
+    def __init__(self, od_cache: OdCache):
         super().__init__(od_cache)
-        self.boxes: List[DetectionBox] = boxes
 
     def ok(self, message: InMessage) -> bool:
+        if message.pixel_masked:
+            return True
         od = self.od_cache.get(message.source_id)
         if od is None:
             return True
-        for box in self.boxes:
-            if od.is_in_masks(box):
-                logger.warning(f'a object which was detected by source({message.source_id}) was in the specified mask')
-                return False
+        width, height = get_snapshot_size(message)
+        if od.get_in_masks_mask(message.get_detection_boxes(), width, height).any():
+            logger.warning(f'a object which was detected by source({message.source_id}) was in the specified mask')
+            return False
         return True
 
 
 class OdFilter(Filter):
+    name = 'od filter'
+    required_input = FilterInput.Detections
+    independent = False
+
     def __init__(self, od_cache: OdCache):
         super().__init__(od_cache)
 
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import json
+import struct
+
+
+# binary frame format, avoids base64 inflation and the json round trip of the whole image:
+# magic(4) | version(1) | flags(1) | source_id length(2) | name length(2) | meta length(4) | source_id | name | meta (json) | jpeg bytes
+class FrameEnvelope:
+    magic = b'FNXF'
+    version = 1
+    header_format = '<4sBBHHI'
+    header_size = struct.calcsize(header_format)
+    flag_ai_clip_enabled = 1
+
+    def __init__(self):
+        self.source_id: str = ''
+        self.name: str = ''
+        self.flags: int = 0
+        self.meta: dict = {}
+        self.image_bytes: bytes = b''
+
+    @staticmethod
+    def is_envelope(data: bytes) -> bool:
+        return data[:4] == FrameEnvelope.magic
+
+    @staticmethod
+    def __unpack_header(data: bytes) -> (int, int, int, int):
+        magic, version, flags, source_id_len, name_len, meta_len = struct.unpack_from(FrameEnvelope.header_format, data)
+        if magic != FrameEnvelope.magic:
+            raise ValueError('data is not a frame envelope')
+        if version > FrameEnvelope.version:
+            raise ValueError(f'unsupported frame envelope version: {version}')
+        return flags, source_id_len, name_len, meta_len
+
+    @staticmethod
+    def peek_source_id(data: bytes) -> str:
+        _, source_id_len, _, _ = FrameEnvelope.__unpack_header(data)
+        offset = FrameEnvelope.header_size
+        return data[offset:offset + source_id_len].decode('utf-8')
+
+    @staticmethod
+    def unpack(data: bytes) -> FrameEnvelope:
+        flags, source_id_len, name_len, meta_len = FrameEnvelope.__unpack_header(data)
+        ret = FrameEnvelope()
+        ret.flags = flags
+        offset = FrameEnvelope.header_size
+        ret.source_id = data[offset:offset + source_id_len].decode('utf-8')
+        offset += source_id_len
+        ret.name = data[offset:offset + name_len].decode('utf-8')
+        offset += name_len
+        if meta_len > 0:
+            ret.meta = json.loads(data[offset:offset + meta_len])
+        offset += meta_len
+        ret.image_bytes = data[offset:]
+        return ret
+
+    def pack(self) -> bytes:
+        source_id = self.source_id.encode('utf-8')
+        name = self.name.encode('utf-8')
+        meta = json.dumps(self.meta).encode('utf-8') if len(self.meta) > 0 else b''
+        header = struct.pack(self.header_format, self.magic, self.version, self.flags, len(source_id), len(name), len(meta))
+        return b''.join((header, source_id, name, meta, self.image_bytes))
+
+    def is_ai_clip_enabled(self) -> bool:
+        return self.flags & self.flag_ai_clip_enabled == self.flag_ai_clip_enabled
+
+    def set_ai_clip_enabled(self, value: bool):
+        if value:
+            self.flags |= self.flag_ai_clip_enabled
+        else:
+            self.flags &= ~self.flag_ai_clip_enabled
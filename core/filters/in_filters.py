@@ -1,55 +1,48 @@
 from __future__ import annotations
 
-from common.utilities import logger
+from typing import Callable
+
+from common.data.filter_stats_repository import FilterStatsRepository
+from common.data.source_model import MotionDetectionType
+from common.utilities import config
 from core.data_changed.od.od_cache import OdCache
 from core.data_changed.prev_image_cache import PrevImageCache
-from core.filters.filters import Filter, TimeFilter, MotionDetectionFilter, ZoneFilter, MaskFilter
+from core.filters.filter_chain import FilterChain
+from core.filters.filters import Filter, FilterInput, FrameFilter, SourceFilter, TimeFilter, MotionDetectionFilter, ZoneFilter, MaskFilter
 from core.filters.messages import InMessage
+from core.motion_detector.motion_confirmation import MotionConfirmation
+from core.motion_detector.motion_detector_registry import MotionDetectorRegistry
 
 
 class InFilters(Filter):
-    def __init__(self, od_cache: OdCache):
+    def __init__(self, od_cache: OdCache, on_motion_event: Callable[[str], None] | None = None,
+                 stats_repository: FilterStatsRepository | None = None):
         super().__init__(od_cache)
         self.prev_image_cache: PrevImageCache | None = None
+        self.motion_detector_registry = MotionDetectorRegistry(config.snapshot.md_detector_idle_timeout)
+        # the filters are created once per process, the chain puts the header only ones before the decoding ones
+        self.chain = FilterChain([
+            SourceFilter(od_cache),
+            TimeFilter(od_cache),
+            FrameFilter(od_cache),
+            MotionDetectionFilter(od_cache, self.motion_detector_registry),
+            ZoneFilter(od_cache),
+            MaskFilter(od_cache)
+        ], config.snapshot.filter_adaptive_enabled, config.snapshot.filter_stats_window, config.snapshot.filter_reorder_interval, 'in filter chain',
+            config.snapshot.filter_report_interval, stats_repository)
+        self.motion_confirmation = MotionConfirmation(config.snapshot, on_motion_event) if config.snapshot.md_confirmation_enabled else None
 
     def set_prev_image_cache(self, prev_image_cache: PrevImageCache):
         self.prev_image_cache = prev_image_cache
+        self.motion_detector_registry.set_prev_img_cache(prev_image_cache)
 
-    # noinspection DuplicatedCode
     def ok(self, dic: dict) -> InMessage | None:
         message = InMessage()
         message.form_dic(dic)
-        if message.np_img is None:
-            logger.error(f'a snapshot image is not valid for source({message.source_id})')
-            return None
-
-        source_model = self.source_cache.get(message.source_id)
-        if source_model is None:
-            logger.error(f'source({message.source_id}) was not found in filters operation')
-            return None
-
-        time_filter: TimeFilter = TimeFilter(self.od_cache)
-        if not time_filter.ok(message):
-            logger.warning(f'time filter is not ok for source({message.source_id})')
-            return None
-
-        motion_detection_filter = MotionDetectionFilter(self.od_cache, source_model, self.prev_image_cache)
-        if not motion_detection_filter.ok(message):
-            logger.warning(f'motion detection filter is not ok for source({message.source_id})')
+        rejected_by = self.chain.run(message)
+        if self.motion_confirmation is None or message.source_model is None or message.source_model.md_type == MotionDetectionType.NoMotionDetection:
+            return message if rejected_by is None else None
+        # only the frames which have reached the motion detection count for the confirmation
+        if rejected_by is not None and rejected_by.required_input == FilterInput.Header:
             return None
-
-        detection_boxes = motion_detection_filter.get_detection_boxes()
-        if len(detection_boxes) == 0:  # it may be NoMotionDetection, ImageHash or PSNR
-            return message
-
-        zone_filter = ZoneFilter(self.od_cache, detection_boxes)
-        if not zone_filter.ok(message):
-            logger.warning(f'zone filter is not ok for source({message.source_id})')
-            return None
-
-        mask_filter = MaskFilter(self.od_cache, detection_boxes)
-        if not mask_filter.ok(message):
-            logger.warning(f'mask filter is not ok for source({message.source_id})')
-            return None
-
-        return message
+        return message if self.motion_confirmation.update(message.source_id, rejected_by is None) else None
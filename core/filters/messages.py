@@ -1,49 +1,198 @@
+from __future__ import annotations
+
 import base64
 import json
+import re
 from typing import List, Any
 import numpy as np
 import numpy.typing as npt
 from PIL import Image, UnidentifiedImageError
 import io
 
+from common.config import FrameFormat
 from common.utilities import logger, datetime_now, config
-from core.filters.detections import DetectionResult
+from common.data.source_model import SourceModel
+from core.filters.detections import DetectionResult, DetectionBox
+from core.filters.frame_envelope import FrameEnvelope
+from core.filters.roi_frame_store import RoiFrameStore
 from core.metadata.color_thief import ColorThief
+from core.motion_detector.box_merger import create_rois
 from core.utilities import generate_id
 
 
 class InMessage:
+    jpeg_soi = b'\xff\xd8\xff'
+    jpeg_eoi = b'\xff\xd9'
+    base64_jpeg_soi = '/9j/'
+    source_pattern = re.compile(rb'"source"\s*:\s*("(?:[^"\\]|\\.)*")')
+
     def __init__(self):
         self.name: str = ''
         self.source_id: str = ''
-        self.base64_image: str = ''
-        self.np_img: npt.NDArray | None = None
-        self.pil_image: Image = None
+        self.base64_image: str = ''  # only set for the legacy json format, so that it is not encoded again on publishing
         self.ai_clip_enabled: bool = False
         self.encoding = 'utf-8'
+        # the image is decoded only when a stage asks for it
+        self.__image_bytes: bytes | None = None
+        self.__pil_image: Image = None
+        self.__np_img: npt.NDArray | None = None
+        self.__decode_failed: bool = False
+        # set by the filter chain stages
+        self.source_model: SourceModel | None = None
+        self.detection_boxes: List[DetectionBox] = []
+        self.pixel_masked: bool = False  # the detection boxes come from a frame whose masked pixels were ignored
+
+    # reads only the source field of a json frame instead of parsing the whole base64 payload, a base64 value can not contain a quote
+    @staticmethod
+    def peek_source_id(dic: dict) -> str:
+        data: bytes = dic['data']
+        if FrameEnvelope.is_envelope(data):
+            return FrameEnvelope.peek_source_id(data)
+        match = InMessage.source_pattern.search(data)
+        if match is not None:
+            return json.loads(match.group(1))
+        return json.loads(data)['source']
 
     def form_dic(self, dic: dict) -> dict:
         data: bytes = dic['data']
-        dic = json.loads(data.decode(self.encoding))
-        self.name = dic['name']
-        self.source_id = dic['source']
-        self.base64_image = dic['img']
-        self.ai_clip_enabled = dic['ai_clip_enabled']
+        if FrameEnvelope.is_envelope(data):
+            envelope = FrameEnvelope.unpack(data)
+            self.name = envelope.name
+            self.source_id = envelope.source_id
+            self.__image_bytes = envelope.image_bytes
+            self.ai_clip_enabled = envelope.is_ai_clip_enabled()
+            dic = envelope.meta
+        else:
+            dic = json.loads(data.decode(self.encoding))
+            self.name = dic['name']
+            self.source_id = dic['source']
+            self.base64_image = dic['img']
+            self.ai_clip_enabled = dic['ai_clip_enabled']
+
+        return dic
 
-        base64_decoded = base64.b64decode(self.base64_image)
+    @property
+    def image_bytes(self) -> bytes:
+        if self.__image_bytes is None:
+            self.__image_bytes = base64.b64decode(self.base64_image)
+        return self.__image_bytes
+
+    @property
+    def pil_image(self) -> Image:
+        if self.__pil_image is None and not self.__decode_failed:
+            try:
+                self.__pil_image = Image.open(io.BytesIO(self.image_bytes))
+            except (UnidentifiedImageError, ValueError) as err:
+                self.__decode_failed = True
+                logger.error(f'an error occurred while creating a PIL image from the frame bytes, err: {err}')
+        return self.__pil_image
+
+    @property
+    def np_img(self) -> npt.NDArray | None:
+        if self.__np_img is None and self.pil_image is not None:
+            try:
+                self.__np_img = np.asarray(self.pil_image)
+            except OSError as err:
+                self.__decode_failed = True
+                logger.error(f'an error occurred while decoding the frame, err: {err}')
+        return self.__np_img
+
+    # checks the JPEG markers without decoding the frame, the other formats fall back to reading the image header
+    def is_valid(self) -> bool:
+        if self.__image_bytes is None and len(self.base64_image) > 0:
+            if self.base64_image.startswith(self.base64_jpeg_soi):
+                try:
+                    tail = base64.b64decode(self.base64_image[-8:])
+                except ValueError:
+                    return False
+                return tail.rstrip(b'\x00').endswith(self.jpeg_eoi)
+        elif self.__image_bytes is not None and self.__image_bytes.startswith(self.jpeg_soi):
+            return self.__image_bytes[-16:].rstrip(b'\x00').endswith(self.jpeg_eoi)
+        return self.pil_image is not None
+
+    # libjpeg scales the DCT down while decoding (draft), so a reduced grayscale frame costs a fraction of the full decode.
+    # returns the frame with the x and y factors which map its coordinates back to the full resolution
+    def create_analysis_img(self, scale: int) -> (npt.NDArray | None, float, float):
         try:
-            self.pil_image = Image.open(io.BytesIO(base64_decoded))
-            self.np_img = np.asarray(self.pil_image)
-        except UnidentifiedImageError as err:
-            logger.error(f'an error occurred while creating a PIL image from base64 string, err: {err}')
+            img = Image.open(io.BytesIO(self.image_bytes))
+            width, height = img.size
+            img.draft('L', (max(width // scale, 1), max(height // scale, 1)))
+            img = img.convert('L')
+            np_img = np.asarray(img)
+            return np_img, width / np_img.shape[1], height / np_img.shape[0]
+        except (UnidentifiedImageError, OSError, ValueError) as err:
+            logger.error(f'an error occurred while creating an analysis image from the frame bytes, err: {err}')
+            return None, 1., 1.
 
-        return dic
+    # the PIL image is kept since it is the one which the bytes were encoded from
+    def set_image_bytes(self, image_bytes: bytes):
+        self.__image_bytes = image_bytes
+        self.__np_img = None
+        self.base64_image = ''
 
-    def create_publish_dic(self) -> str:
-        dic = {'name': self.name, 'source_id': self.source_id, 'base64_image': self.base64_image, 'ai_clip_enabled': self.ai_clip_enabled}
+    # replaces the frame, e.g. a crop with the whole frame which it has been cut from
+    def set_frame_bytes(self, image_bytes: bytes):
+        self.__image_bytes = image_bytes
+        self.__pil_image = None
+        self.__np_img = None
+        self.__decode_failed = False
+        self.base64_image = ''
+
+    def get_detection_boxes(self) -> List[DetectionBox]:
+        return self.detection_boxes
+
+    def get_base64_image(self) -> str:
+        if len(self.base64_image) == 0:
+            self.base64_image = base64.b64encode(self.image_bytes).decode()
+        return self.base64_image
+
+    def _create_envelope(self, meta: dict, image_bytes: bytes | None = None) -> bytes:
+        envelope = FrameEnvelope()
+        envelope.source_id = self.source_id
+        envelope.name = self.name
+        envelope.set_ai_clip_enabled(self.ai_clip_enabled)
+        envelope.meta = meta
+        envelope.image_bytes = self.image_bytes if image_bytes is None else image_bytes
+        return envelope.pack()
+
+    def create_publish_dic(self) -> str | bytes:
+        if config.snapshot.publish_format == FrameFormat.Binary:
+            return self._create_envelope({})
+        dic = {'name': self.name, 'source_id': self.source_id, 'base64_image': self.get_base64_image(), 'ai_clip_enabled': self.ai_clip_enabled}
         js = json.dumps(dic)
         return js
 
+    # publishes the regions of the motion boxes instead of the whole frame, each one with its offset in the frame (roi), so that the
+    # detections of a crop can be mapped back to the frame. The whole frame is kept in the frame store for the out side, it is published
+    # instead of the crops if the crops would not save much or it could not be stored
+    def create_roi_publish_list(self, frame_store: RoiFrameStore) -> List[str | bytes]:
+        snapshot_config = config.snapshot
+        pil_image = self.pil_image
+        if pil_image is None or self.ai_clip_enabled:  # the ai clips are recorded from the whole frames
+            return [self.create_publish_dic()]
+        width, height = pil_image.size
+        rois = create_rois(self.detection_boxes, snapshot_config.roi_crop_padding, snapshot_config.roi_crop_max_count, width, height)
+        if len(rois) == 0 or sum((b.x2 - b.x1) * (b.y2 - b.y1) for b in rois) > snapshot_config.roi_crop_max_area_ratio * width * height:
+            return [self.create_publish_dic()]
+        frame_id = generate_id()
+        if not frame_store.set(frame_id, self.image_bytes):
+            return [self.create_publish_dic()]
+        ret = []
+        for b in rois:
+            buffered = io.BytesIO()
+            pil_image.crop((b.x1, b.y1, b.x2, b.y2)).save(buffered, format='JPEG')
+            roi = {'x': b.x1, 'y': b.y1, 'width': b.x2 - b.x1, 'height': b.y2 - b.y1, 'frame_width': width, 'frame_height': height,
+                   'frame_id': frame_id, 'count': len(rois)}
+            ret.append(self.__create_roi_publish_dic(buffered.getvalue(), roi))
+        return ret
+
+    def __create_roi_publish_dic(self, image_bytes: bytes, roi: dict) -> str | bytes:
+        if config.snapshot.publish_format == FrameFormat.Binary:
+            return self._create_envelope({'roi': roi}, image_bytes)
+        dic = {'name': self.name, 'source_id': self.source_id, 'base64_image': base64.b64encode(image_bytes).decode(),
+               'ai_clip_enabled': self.ai_clip_enabled, 'roi': roi}
+        return json.dumps(dic)
+
 
 class OutMessage(InMessage):
     def __init__(self):
@@ -51,24 +200,54 @@ class OutMessage(InMessage):
         self.channel: str = ''
         self.list_name: str = ''
         self.detections: List[DetectionResult] = []
+        self.roi: dict | None = None  # set if the detections have been made on a crop of the frame
 
     def form_dic(self, dic: dict):
         dic = super(OutMessage, self).form_dic(dic)
         self.channel = dic['channel']
         self.list_name = dic['list_name']
+        self.roi = dic.get('roi')
         ds = dic['detections']
         for d in ds:
-            r = DetectionResult()
-            r.pred_cls_name = d['pred_cls_name']
-            r.pred_cls_idx = d['pred_cls_idx']
-            r.pred_score = d['pred_score']
-            b = d['box']
-            box = r.box
-            box.x1 = b['x1']
-            box.y1 = b['y1']
-            box.x2 = b['x2']
-            box.y2 = b['y2']
-            self.detections.append(r)
+            self.detections.append(self.create_detection(d))
+
+    @staticmethod
+    def create_detection(d: dict) -> DetectionResult:
+        r = DetectionResult()
+        r.pred_cls_name = d['pred_cls_name']
+        r.pred_cls_idx = d['pred_cls_idx']
+        r.pred_score = d['pred_score']
+        b = d['box']
+        box = r.box
+        box.x1 = b['x1']
+        box.y1 = b['y1']
+        box.x2 = b['x2']
+        box.y2 = b['y2']
+        return r
+
+    # the detections in the frame coordinates, in the format of the detection services
+    def create_detection_dics(self) -> List[dict]:
+        return [{'pred_cls_name': d.pred_cls_name, 'pred_cls_idx': d.pred_cls_idx, 'pred_score': d.pred_score,
+                 'box': {'x1': b.x1, 'y1': b.y1, 'x2': b.x2, 'y2': b.y2}} for d, b in zip(self.detections, self.get_detection_boxes())]
+
+    # in the frame coordinates, which the zones and the masks are drawn on
+    def get_detection_boxes(self) -> List[DetectionBox]:
+        if self.roi is None:
+            return [d.box for d in self.detections]
+        ret = []
+        x, y = self.roi['x'], self.roi['y']
+        for d in self.detections:
+            box = DetectionBox()
+            box.x1, box.y1, box.x2, box.y2 = d.box.x1 + x, d.box.y1 + y, d.box.x2 + x, d.box.y2 + y
+            ret.append(box)
+        return ret
+
+    # the crop is replaced with the whole frame which it has been cut from and the detections with the ones of all the crops of the frame, so
+    # that the overlay is drawn on and the message is published with the whole frame like the ones without a roi
+    def restore_frame(self, image_bytes: bytes, detections: List[DetectionResult]):
+        self.detections = detections
+        self.roi = None
+        self.set_frame_bytes(image_bytes)
 
     def __create_metadata_colors(self, detection: DetectionResult) -> List[Any]:
         colors = []
@@ -81,7 +260,7 @@ class OutMessage(InMessage):
             colors.append({'r': p[0], 'g': p[1], 'b': p[2]})
         return colors
 
-    def create_publish_dic(self) -> str:
+    def create_publish_dic(self) -> str | bytes:
         ds = []
         for d in self.detections:
             b = d.box
@@ -90,8 +269,11 @@ class OutMessage(InMessage):
             if config.snapshot.meta_color_enabled:
                 ds_item['metadata']['colors'] = self.__create_metadata_colors(d)
             ds.append(ds_item)
+        if config.snapshot.publish_format == FrameFormat.Binary:
+            meta = {'id': generate_id(), 'created_at': datetime_now(), 'list_name': self.list_name, self.list_name: ds}
+            return self._create_envelope(meta)
         dic = {'id': generate_id(), 'source_id': self.source_id, 'created_at': datetime_now(),
-               self.list_name: ds, 'base64_image': self.base64_image, 'ai_clip_enabled': self.ai_clip_enabled}
+               self.list_name: ds, 'base64_image': self.get_base64_image(), 'ai_clip_enabled': self.ai_clip_enabled}
         # self.detections was already came form self.dic
         js = json.dumps(dic)
         return js
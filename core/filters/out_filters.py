@@ -3,21 +3,35 @@ from __future__ import annotations
 from PIL import ImageDraw
 from typing import List
 import io
-import base64
 
+from common.data.filter_stats_repository import FilterStatsRepository
+from common.data.source_model import MotionDetectionType
 from common.utilities import logger, config
 from core.data_changed.od.od_cache import OdCache
 from core.event_handlers.channel_names import EventChannels
-from core.filters.filters import Filter, ZoneFilter, MaskFilter, OdFilter
+from core.filters.filter_chain import FilterChain
+from core.filters.filters import Filter, ZoneFilter, MaskFilter, OdFilter, SourceFilter, FrameFilter
 from core.filters.messages import OutMessage
+from core.filters.roi_frame_store import RoiFrameStore
 
 
 class OutFilters(Filter):
-    def __init__(self, od_cache: OdCache):
+    # the motion detection types which compare whole frames, so that they do not produce any box which could be checked on the in side
+    frame_md_types = (MotionDetectionType.ImageHash, MotionDetectionType.Psnr)
+
+    def __init__(self, od_cache: OdCache, roi_frame_store: RoiFrameStore, stats_repository: FilterStatsRepository | None = None):
         super().__init__(od_cache)
+        self.roi_frame_store = roi_frame_store
         self.colors = self.__create_colors()
         self.colors_length = len(self.colors)
         self.overlay = config.snapshot.overlay
+        self.frame_chain = FilterChain([FrameFilter(od_cache)])
+        self.od_chain = FilterChain([SourceFilter(od_cache), OdFilter(od_cache)])
+        # the boxes of OpenCV and background subtraction motion detection have already been filtered on the in side
+        snapshot_config = config.snapshot
+        self.zone_chain = FilterChain([ZoneFilter(od_cache), MaskFilter(od_cache)], snapshot_config.filter_adaptive_enabled,
+                                      snapshot_config.filter_stats_window, snapshot_config.filter_reorder_interval, 'out zone filter chain',
+                                      snapshot_config.filter_report_interval, stats_repository)
 
     @staticmethod
     def __create_colors() -> List[str]:
@@ -35,9 +49,8 @@ class OutFilters(Filter):
                 '#F5DEB3', '#FFFFFF', '#F5F5F5', '#00FFFF', '#9ACD32']
 
     def __draw(self, message: OutMessage):
-        np_image = message.np_img
-        if np_image is None:
-            logger.error(f'could not convert base64 image to numpy array, source id:{message.source_id}, channel: {message.channel}')
+        if message.pil_image is None:
+            logger.error(f'could not convert base64 image to PIL image, source id:{message.source_id}, channel: {message.channel}')
             return
         # pil_image = Image.fromarray(np_image)
         for idx, d in enumerate(message.detections):
@@ -50,41 +63,45 @@ class OutFilters(Filter):
             draw.text(xy1, text)
             # cv2.rectangle(np_image, xy1, xy2, color)
             # cv2.putText(np_image, text, xy1, cv2.FONT_HERSHEY_SIMPLEX, 1, color, thickness=1)
-        # set base64 image again
+        # set image bytes again
         buffered = io.BytesIO()
         message.pil_image.save(buffered, format="JPEG")
-        img_to_bytes = buffered.getvalue()
-        message.base64_image = base64.b64encode(img_to_bytes).decode()
+        message.set_image_bytes(buffered.getvalue())
+
+    def __run_chains(self, message: OutMessage) -> bool:
+        if message.channel == EventChannels.od_service:
+            if self.od_chain.run(message) is not None:
+                return False
+            if message.source_model.md_type in self.frame_md_types and self.zone_chain.run(message) is not None:
+                return False
+        return self.frame_chain.run(message) is None
+
+    # the detections of the crops of a frame are published once, with the whole frame, so that the consumers of the out channels always get
+    # whole frames. A rejected crop adds no detection, the frame is dropped if none of its crops has any
+    def __restore_frame(self, message: OutMessage, passed: bool) -> bool:
+        roi = message.roi
+        frame_id = roi.get('frame_id', '')
+        detections = self.roi_frame_store.add_detections(frame_id, message.channel, message.create_detection_dics() if passed else [],
+                                                         roi.get('count', 1))
+        if detections is None or len(detections) == 0:
+            return False
+        image_bytes = self.roi_frame_store.get(frame_id)
+        if image_bytes is None:
+            logger.warning(f'the whole frame of the crops of source({message.source_id}) has expired, their detections are dropped')
+            return False
+        message.restore_frame(image_bytes, [OutMessage.create_detection(d) for d in detections])
+        return True
 
-    # noinspection DuplicatedCode
     def ok(self, dic: dict) -> OutMessage | None:
         message = OutMessage()
         message.form_dic(dic)
-        if message.np_img is None:
-            logger.error(f'a snapshot image is not valid for source({message.source_id})')
-            return None
 
-        if message.channel == EventChannels.od_service:
-            source_model = self.source_cache.get(message.source_id)
-            if source_model is None:
-                logger.error(f'source({message.source_id}) was not found in filters operation')
-                return None
-
-            od_filter = OdFilter(self.od_cache)
-            if not od_filter.ok(message):
-                logger.warning(f'od filter is not ok for source({message.source_id})')
+        passed = self.__run_chains(message)
+        if message.roi is not None:
+            if not self.__restore_frame(message, passed):
                 return None
-
-            boxes = [d.box for d in message.detections]
-            if source_model.md_type > 1 and len(boxes) > 0:
-                zone_filter = ZoneFilter(self.od_cache, boxes)
-                if not zone_filter.ok(message):
-                    logger.warning(f'zone filter is not ok for source({message.source_id})')
-                    return None
-                mask_filter = MaskFilter(self.od_cache, boxes)
-                if not mask_filter.ok(message):
-                    logger.warning(f'mask filter is not ok for source({message.source_id})')
-                    return None
+        elif not passed:
+            return None
 
         if self.overlay:
             self.__draw(message)
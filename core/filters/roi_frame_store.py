@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+from typing import List
+
+from redis.client import Redis
+
+from common.utilities import logger
+
+
+# the whole frames of the crops which have been published to snapshot_in, the out side draws the overlay on them and publishes them
+# instead of the crops. The detections of the crops of a frame are collected per channel, since they may come to different workers, and the
+# frame is published once with all of them. They expire after ttl seconds, so the ones whose crops have never come back do not pile up
+class RoiFrameStore:
+    def __init__(self, connection: Redis, ttl: int):
+        self.connection = connection
+        self.ttl = ttl
+        self.prefix = 'roi_frames:'
+
+    def set(self, frame_id: str, image_bytes: bytes) -> bool:
+        try:
+            self.connection.set(f'{self.prefix}{frame_id}', image_bytes, ex=self.ttl)
+            return True
+        except BaseException as ex:
+            logger.error(f'an error occurred while storing the whole frame of the crops, ex: {ex}')
+            return False
+
+    def get(self, frame_id: str) -> bytes | None:
+        try:
+            return self.connection.get(f'{self.prefix}{frame_id}')
+        except BaseException as ex:
+            logger.error(f'an error occurred while reading the whole frame of a crop, ex: {ex}')
+            return None
+
+    # adds the detections of a crop (an empty list for a rejected one). Returns the detections of all the crops once the last one of count
+    # crops has been added, None before that, so only one worker gets them
+    def add_detections(self, frame_id: str, channel: str, detections: List[dict], count: int) -> List[dict] | None:
+        key = f'{self.prefix}{frame_id}:{channel}'
+        try:
+            pipeline = self.connection.pipeline()
+            pipeline.rpush(key, json.dumps(detections))
+            pipeline.expire(key, self.ttl)
+            length = pipeline.execute()[0]
+            if length < count:
+                return None
+            pipeline = self.connection.pipeline()
+            pipeline.lrange(key, 0, -1)
+            pipeline.delete(key)
+            items = pipeline.execute()[0]
+        except BaseException as ex:
+            logger.error(f'an error occurred while collecting the detections of the crops, ex: {ex}')
+            return None
+        ret = []
+        for item in items:
+            ret.extend(json.loads(item))
+        return ret
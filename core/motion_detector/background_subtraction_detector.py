@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from typing import List
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+from common.data.source_model import SourceModel, BackgroundSubtractorType
+from common.utilities import logger
+from core.data_changed.prev_image_cache import PrevImageCache
+from core.filters.detections import DetectionBox
+from core.motion_detector.base_motion_detector import BaseMotionDetector, HasMotionResult
+
+
+# keeps a MOG2/KNN background model per source instead of a single previous frame, so gradual lighting changes and sensor noise are learnt
+# into the background. The model lives in the detector instance of the worker process, the SourceAffinity dispatch mode feeds every frame of
+# a source into the same model. The background model is the state, so there is no previous image to compare with
+class BackgroundSubtractionDetector(BaseMotionDetector):
+    kernel = np.ones((3, 3), dtype=np.uint8)
+    shadow_threshold = 200  # the shadows are marked as 127 in the foreground mask
+
+    def __init__(self, source_model: SourceModel, prev_img_cache: PrevImageCache):
+        super(BackgroundSubtractionDetector, self).__init__(source_model, prev_img_cache)
+        self.subtractor = self.__create_subtractor(source_model)
+        self.frame_shape: tuple = ()
+        self.fg_mask: npt.NDArray | None = None
+
+    @staticmethod
+    def __create_subtractor(source_model: SourceModel):
+        if source_model.md_bg_subtractor_type == BackgroundSubtractorType.KNN:
+            return cv2.createBackgroundSubtractorKNN(history=source_model.md_bg_history, dist2Threshold=source_model.md_bg_dist2_threshold,
+                                                     detectShadows=True)
+        return cv2.createBackgroundSubtractorMOG2(history=source_model.md_bg_history, varThreshold=source_model.md_bg_var_threshold,
+                                                  detectShadows=True)
+
+    def _process_img(self, whole_img: npt.NDArray) -> npt.NDArray:
+        gray = cv2.cvtColor(whole_img, cv2.COLOR_BGR2GRAY) if whole_img.ndim == 3 else whole_img
+        height, width = gray.shape
+        max_width = self.source_model.md_bg_width
+        if 0 < max_width < width:
+            gray = cv2.resize(gray, (max_width, max(int(height * max_width / width), 1)), interpolation=cv2.INTER_AREA)
+        return gray
+
+    def has_motion(self, whole_img: npt.NDArray) -> HasMotionResult:
+        source_model = self.source_model
+        img = self._process_img(whole_img)
+        first_time = self.frame_shape != img.shape
+        if first_time:  # e.g. the resolution or the analysis scale has been changed
+            if len(self.frame_shape) > 0:
+                self.subtractor = self.__create_subtractor(source_model)
+            self.frame_shape = img.shape
+            self.fg_mask = np.empty_like(img)
+        fg_mask = self.subtractor.apply(img, self.fg_mask, source_model.md_bg_learning_rate)
+        if first_time:
+            logger.info(f'{self.type_name} (camera {source_model.id}) detected first time')
+            return HasMotionResult.create(False)
+
+        cv2.threshold(fg_mask, self.shadow_threshold, 255, cv2.THRESH_BINARY, dst=fg_mask)
+        cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, self.kernel, dst=fg_mask)
+
+        # the boxes and the contour area limit are given for the frame which has been passed in
+        fx, fy = whole_img.shape[1] / img.shape[1], whole_img.shape[0] / img.shape[0]
+        contour_area_limit = source_model.md_contour_area_limit / (fx * fy)
+        if source_model.md_analysis_scale > 1:
+            contour_area_limit /= source_model.md_analysis_scale * source_model.md_analysis_scale
+        contours, _ = cv2.findContours(image=fg_mask, mode=cv2.RETR_EXTERNAL, method=cv2.CHAIN_APPROX_SIMPLE)
+        boxes: List[DetectionBox] = []
+        for contour in contours:
+            if cv2.contourArea(contour) < contour_area_limit:
+                continue
+            (x, y, w, h) = cv2.boundingRect(contour)
+            box = DetectionBox()
+            box.x1, box.y1, box.x2, box.y2 = x, y, x + w, y + h
+            box.scale(fx, fy, whole_img.shape[1], whole_img.shape[0])
+            boxes.append(box)
+
+        if len(boxes) == 0:
+            logger.info(f'{self.type_name} (camera {source_model.id}) did not detect any motion')
+        ret = HasMotionResult.create(len(boxes) > 0)
+        ret.detection_boxes = boxes
+        return ret
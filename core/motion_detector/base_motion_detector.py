@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
 from typing import List
 
@@ -13,6 +15,7 @@ class HasMotionResult:
     def __init__(self):
         self.detection_boxes: List[DetectionBox] = []
         self.has_motion: bool = False
+        self.motion_map: npt.NDArray | None = None  # per cell motion scores of the detectors which have them
 
     @staticmethod
     def create(has_motion: bool):
@@ -29,19 +32,30 @@ class BaseMotionDetector(ABC):
         self.source_model = source_model
         self.prev_img_cache = prev_img_cache
         self.type_name = type(self).__name__
+        self.thumbnail: npt.NDArray | None = None  # of the last frame which has passed the pre-check
+        self.pixel_mask: npt.NDArray | None = None  # set per frame by the motion detection filter, only the detectors which support it use it
+
+    @abstractmethod
+    def has_motion(self, whole_img: npt.NDArray) -> HasMotionResult:
+        raise NotImplementedError('BaseMotionDetector.has_motion()')
+
 
+# compares every frame with the previous image of its source, which is replaced once a motion has been detected
+class PrevImageMotionDetector(BaseMotionDetector, ABC):
     @abstractmethod
     def _process_img(self, whole_img: npt.NDArray) -> any:
-        raise NotImplementedError('BaseMotionDetector._process_img()')
+        raise NotImplementedError('PrevImageMotionDetector._process_img()')
 
     @abstractmethod
     def _has_motion(self, source_model: SourceModel, processed_img: any, prev_processed_img: any) -> HasMotionResult:
-        raise NotImplementedError('BaseMotionDetector._get_loss()')
+        raise NotImplementedError('PrevImageMotionDetector._has_motion()')
 
     def has_motion(self, whole_img: npt.NDArray) -> HasMotionResult:
         source_id = self.source_model.id
         processed_img = self._process_img(whole_img)
         prev_img = self.prev_img_cache.get(source_id)
+        if prev_img is not None and prev_img.shape != processed_img.shape:  # e.g. the resolution or the analysis scale has been changed
+            prev_img = None
         if prev_img is not None:
             result = self._has_motion(self.source_model, processed_img, prev_img)
             if result.has_motion:
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from typing import List
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+from common.data.source_model import SourceModel
+from core.data_changed.prev_image_cache import PrevImageCache
+from core.filters.detections import DetectionBox
+from core.motion_detector.base_motion_detector import PrevImageMotionDetector, HasMotionResult
+
+
+# scores a rows x columns grid by the mean absolute difference of each cell, which is a single reduction over a small downsampled frame
+# instead of blurring, thresholding and contouring the whole frame. The neighbour cells over the threshold are merged into one box
+class BlockGridDetector(PrevImageMotionDetector):
+    cell_size = 8  # pixels of a cell in the downsampled frame
+
+    def __init__(self, source_model: SourceModel, prev_img_cache: PrevImageCache):
+        super(BlockGridDetector, self).__init__(source_model, prev_img_cache)
+        self.rows = max(source_model.md_grid_rows, 1)
+        self.columns = max(source_model.md_grid_columns, 1)
+        self.frame_size: tuple = (1, 1)  # width and height of the frame which has been passed in
+        self.diff_frame: npt.NDArray | None = None
+        self.motion_map: npt.NDArray = np.zeros((self.rows, self.columns), dtype=np.float32)
+
+    def _process_img(self, whole_img: npt.NDArray) -> npt.NDArray:
+        self.frame_size = (whole_img.shape[1], whole_img.shape[0])
+        gray = cv2.cvtColor(whole_img, cv2.COLOR_BGR2GRAY) if whole_img.ndim == 3 else whole_img
+        return cv2.resize(gray, (self.columns * self.cell_size, self.rows * self.cell_size), interpolation=cv2.INTER_LINEAR)  # the cell means smooth the aliasing out
+
+    def _has_motion(self, source_model: SourceModel, processed_img: npt.NDArray, prev_processed_img: npt.NDArray) -> HasMotionResult:
+        if self.diff_frame is None or self.diff_frame.shape != processed_img.shape:
+            self.diff_frame = np.empty_like(processed_img)
+        diff_frame = cv2.absdiff(prev_processed_img, processed_img, dst=self.diff_frame)
+        size = self.cell_size
+        np.mean(diff_frame.reshape(self.rows, size, self.columns, size), axis=(1, 3), dtype=np.float32, out=self.motion_map)
+
+        cells = (self.motion_map > source_model.md_grid_threshold).astype(np.uint8)
+        boxes: List[DetectionBox] = []
+        if cells.any():
+            # the connected cells of the small grid become one box, 8-connectivity merges the diagonal ones as well
+            count, _, stats, _ = cv2.connectedComponentsWithStats(cells, connectivity=8)
+            fx, fy = self.frame_size[0] / self.columns, self.frame_size[1] / self.rows
+            for x, y, w, h, _ in stats[1:count]:
+                box = DetectionBox()
+                box.x1, box.y1, box.x2, box.y2 = x, y, x + w, y + h
+                box.scale(fx, fy, self.frame_size[0], self.frame_size[1])
+                boxes.append(box)
+
+        ret = HasMotionResult.create(len(boxes) > 0)
+        ret.detection_boxes = boxes
+        ret.motion_map = self.motion_map.copy()
+        return ret
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from typing import List
+
+import numpy as np
+import numpy.typing as npt
+
+from core.filters.detections import DetectionBox
+
+
+def to_array(boxes: List[DetectionBox]) -> npt.NDArray:
+    return np.array([(b.x1, b.y1, b.x2, b.y2) for b in boxes], dtype=np.int64).reshape(-1, 4)
+
+
+def to_boxes(arr: npt.NDArray) -> List[DetectionBox]:
+    ret: List[DetectionBox] = []
+    for x1, y1, x2, y2 in arr.tolist():
+        box = DetectionBox()
+        box.x1, box.y1, box.x2, box.y2 = x1, y1, x2, y2
+        ret.append(box)
+    return ret
+
+
+# grows the boxes by padding on each side, clipped to the frame
+def pad(arr: npt.NDArray, padding: int, width: int, height: int) -> npt.NDArray:
+    ret = arr + (-padding, -padding, padding, padding)
+    np.clip(ret[:, 0::2], 0, width, out=ret[:, 0::2])
+    np.clip(ret[:, 1::2], 0, height, out=ret[:, 1::2])
+    return ret
+
+
+def get_areas(arr: npt.NDArray) -> npt.NDArray:
+    return (arr[:, 2] - arr[:, 0]) * (arr[:, 3] - arr[:, 1])
+
+
+# replaces the boxes which overlap (or are closer than distance) with their union until no such pair is left
+def merge_overlapping(arr: npt.NDArray, distance: int = 0) -> npt.NDArray:
+    arr = arr.copy()
+    merged = True
+    while merged and len(arr) > 1:
+        merged = False
+        # pairwise overlap test of all the boxes at once
+        overlaps = ((arr[:, None, 0] <= arr[None, :, 2] + distance) & (arr[None, :, 0] <= arr[:, None, 2] + distance) &
+                    (arr[:, None, 1] <= arr[None, :, 3] + distance) & (arr[None, :, 1] <= arr[:, None, 3] + distance))
+        np.fill_diagonal(overlaps, False)
+        i, j = np.nonzero(np.triu(overlaps))
+        if len(i) > 0:
+            i, j = i[0], j[0]
+            arr[i] = (min(arr[i, 0], arr[j, 0]), min(arr[i, 1], arr[j, 1]), max(arr[i, 2], arr[j, 2]), max(arr[i, 3], arr[j, 3]))
+            arr = np.delete(arr, j, axis=0)
+            merged = True
+    return arr
+
+
+# merges the pair whose union grows the covered area the least until max_count boxes are left
+def reduce_count(arr: npt.NDArray, max_count: int) -> npt.NDArray:
+    arr = arr.copy()
+    max_count = max(max_count, 1)
+    while len(arr) > max_count:
+        unions = np.stack([np.minimum(arr[:, None, 0], arr[None, :, 0]), np.minimum(arr[:, None, 1], arr[None, :, 1]),
+                           np.maximum(arr[:, None, 2], arr[None, :, 2]), np.maximum(arr[:, None, 3], arr[None, :, 3])], axis=-1)
+        areas = get_areas(arr)
+        costs = ((unions[..., 2] - unions[..., 0]) * (unions[..., 3] - unions[..., 1]) - areas[:, None] - areas[None, :]).astype(float)
+        costs[np.tril_indices(len(arr))] = np.inf
+        i, j = np.unravel_index(np.argmin(costs), costs.shape)
+        arr[i] = unions[i, j]
+        arr = np.delete(arr, j, axis=0)
+    return arr
+
+
+def drop_small(arr: npt.NDArray, min_area: float) -> npt.NDArray:
+    return arr[get_areas(arr) >= min_area]
+
+
+def keep_largest(arr: npt.NDArray, max_count: int) -> npt.NDArray:
+    if len(arr) <= max_count:
+        return arr
+    return arr[np.sort(np.argsort(-get_areas(arr), kind='stable')[:max_count])]
+
+
+# the regions of interest of a frame: the padded boxes merged where they overlap, at most max_count of them
+def create_rois(boxes: List[DetectionBox], padding: int, max_count: int, width: int, height: int) -> List[DetectionBox]:
+    if len(boxes) == 0:
+        return []
+    arr = merge_overlapping(pad(to_array(boxes), padding, width, height))
+    arr = merge_overlapping(reduce_count(arr, max_count))
+    return to_boxes(arr)
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from typing import List
+
+from common.config import SnapshotConfig
+from core.filters.detections import DetectionBox
+from core.motion_detector.box_merger import to_array, to_boxes, merge_overlapping, drop_small, keep_largest
+
+
+# cleans the motion boxes up before the zone and mask filters: unions the overlapping or nearby ones, drops the ones which are small relative
+# to the frame and keeps the largest ones up to the max count, so that a noisy frame brings a handful of boxes instead of dozens
+class BoxPostProcessor:
+    def __init__(self, snapshot_config: SnapshotConfig):
+        self.merge_distance = snapshot_config.md_box_merge_distance
+        self.min_area_ratio = snapshot_config.md_box_min_area_ratio
+        self.max_count = snapshot_config.md_box_max_count
+
+    def process(self, boxes: List[DetectionBox], width: int, height: int) -> List[DetectionBox]:
+        if len(boxes) == 0:
+            return boxes
+        arr = to_array(boxes)
+        if self.merge_distance > -1:
+            arr = merge_overlapping(arr, self.merge_distance)
+        if self.min_area_ratio > 0.:
+            arr = drop_small(arr, self.min_area_ratio * width * height)
+        if self.max_count > 0:
+            arr = keep_largest(arr, self.max_count)
+        return to_boxes(arr)
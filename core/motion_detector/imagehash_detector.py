@@ -1,21 +1,32 @@
 import imagehash
+import numpy as np
 from PIL import Image
 import numpy.typing as npt
 
-from common.data.source_model import SourceModel
+from common.data.source_model import SourceModel, ImageHashType
 from core.data_changed.prev_image_cache import PrevImageCache
-from core.motion_detector.base_motion_detector import BaseMotionDetector, HasMotionResult
+from core.motion_detector.base_motion_detector import PrevImageMotionDetector, HasMotionResult
 
 
-class ImageHashDetector(BaseMotionDetector):
+class ImageHashDetector(PrevImageMotionDetector):
+    hash_functions = {
+        ImageHashType.AverageHash: imagehash.average_hash,
+        ImageHashType.DHash: imagehash.dhash,
+        ImageHashType.PHash: imagehash.phash,
+        ImageHashType.WHash: imagehash.whash
+    }
+
     def __init__(self, source_model: SourceModel, prev_img_cache: PrevImageCache):
         super(ImageHashDetector, self).__init__(source_model, prev_img_cache)
+        self.hash_function = self.hash_functions.get(source_model.md_imagehash_type, imagehash.average_hash)
 
-    def _process_img(self, whole_img: npt.NDArray) -> Image:
-        return Image.fromarray(whole_img)
+    # only the hash of the frame is kept as the previous image, 8 bytes (64 bits packed) instead of a whole frame
+    def _process_img(self, whole_img: npt.NDArray) -> npt.NDArray:
+        image_hash = self.hash_function(Image.fromarray(whole_img))
+        return np.packbits(image_hash.hash)
 
-    def _has_motion(self, source_model: SourceModel, processed_img: Image, prev_processed_img: Image) -> HasMotionResult:
-        hash1 = imagehash.average_hash(processed_img)
-        hash2 = imagehash.average_hash(prev_processed_img)
-        loss = hash1 - hash2
+    def _has_motion(self, source_model: SourceModel, processed_img: npt.NDArray, prev_processed_img: npt.NDArray) -> HasMotionResult:
+        if processed_img.shape != prev_processed_img.shape:  # the hash type has been changed
+            return HasMotionResult.create(True)
+        loss = int(np.unpackbits(np.bitwise_xor(processed_img, prev_processed_img)).sum())
         return HasMotionResult.create(loss > source_model.md_imagehash_threshold)
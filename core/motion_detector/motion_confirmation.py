@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+import time
+from collections import deque
+from threading import Lock, Thread
+from typing import Dict, Callable
+
+from common.config import SnapshotConfig, DispatchMode
+from common.utilities import logger, datetime_now
+
+
+class MotionEpisode:
+    def __init__(self, window: int):
+        self.window = deque(maxlen=window)
+        self.active: bool = False
+        self.started_at: float = 0.
+        self.last_forwarded_at: float = 0.
+        self.last_seen_at: float = 0.
+        self.forwarded_count: int = 0
+
+
+# a source is in a motion episode after motion has been detected in count of the last window frames, and it is out of it once none of the
+# last window frames has any motion, or once it has not sent any frame for idle timeout seconds. A single noisy frame is never forwarded,
+# and the frames of an episode are forwarded at most once per forward interval. The state is per process, so it is rejected unless the
+# SourceAffinity dispatch mode sends every frame of a source to the same worker
+class MotionConfirmation:
+    def __init__(self, snapshot_config: SnapshotConfig, on_event: Callable[[str], None] | None = None):
+        if snapshot_config.dispatch_mode != DispatchMode.SourceAffinity:
+            raise ValueError('motion confirmation (md_confirmation_enabled) requires the SourceAffinity dispatch mode')
+        self.count = max(snapshot_config.md_confirmation_count, 1)
+        self.window = max(snapshot_config.md_confirmation_window, self.count)
+        self.forward_interval = snapshot_config.md_episode_forward_interval
+        self.idle_timeout = snapshot_config.md_episode_idle_timeout  # 0 means never
+        self.on_event = on_event
+        self.episodes: Dict[str, MotionEpisode] = {}
+        self.lock = Lock()
+        self.expire_thread: Thread | None = None
+
+    # returns True if the frame should be forwarded
+    def update(self, source_id: str, has_motion: bool) -> bool:
+        with self.lock:
+            return self.__update(source_id, has_motion)
+
+    def __update(self, source_id: str, has_motion: bool) -> bool:
+        # started by the first frame, so that it runs in the worker process which owns the episodes
+        if self.expire_thread is None and self.idle_timeout > 0.:
+            self.expire_thread = Thread(target=self.__expire_loop, name='motion-episode-expire', daemon=True)
+            self.expire_thread.start()
+        episode = self.episodes.get(source_id)
+        if episode is None:
+            episode = MotionEpisode(self.window)
+            self.episodes[source_id] = episode
+        episode.window.append(has_motion)
+        motion_count = sum(episode.window)
+        now = time.monotonic()
+        episode.last_seen_at = now
+        if not episode.active:
+            if motion_count < self.count:
+                return False
+            episode.active = True
+            episode.started_at = now
+            episode.forwarded_count = 0
+            self.__emit(source_id, 'started', episode, now)
+        elif motion_count == 0:
+            episode.active = False
+            self.__emit(source_id, 'ended', episode, now)
+            return False
+
+        if not has_motion or now - episode.last_forwarded_at < self.forward_interval:
+            return False
+        episode.last_forwarded_at = now
+        episode.forwarded_count += 1
+        return True
+
+    # the frames of a source which has stopped sending them never come, so its episode is ended here
+    def __expire_loop(self):
+        while True:
+            time.sleep(min(self.idle_timeout, 1.))
+            try:
+                self.expire()
+            except BaseException as ex:
+                logger.error(f'an error occurred while ending the idle motion episodes, ex: {ex}')
+
+    def expire(self):
+        with self.lock:
+            now = time.monotonic()
+            for source_id in [source_id for source_id, episode in self.episodes.items() if now - episode.last_seen_at > self.idle_timeout]:
+                episode = self.episodes.pop(source_id)
+                if episode.active:
+                    self.__emit(source_id, 'ended', episode, now)
+
+    def __emit(self, source_id: str, event_type: str, episode: MotionEpisode, now: float):
+        logger.info(f'motion has {event_type} for source({source_id})')
+        if self.on_event is None:
+            return
+        dic = {'source_id': source_id, 'event': event_type, 'created_at': datetime_now(),
+               'duration': now - episode.started_at, 'forwarded_count': episode.forwarded_count}
+        try:
+            self.on_event(json.dumps(dic))
+        except BaseException as ex:
+            logger.error(f'an error occurred while publishing a motion event of source({source_id}), ex: {ex}')
+
+    def remove(self, source_id: str):
+        with self.lock:
+            self.episodes.pop(source_id, None)
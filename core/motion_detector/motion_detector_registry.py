@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import time
+from typing import Dict, Tuple
+
+from common.data.source_model import SourceModel, MotionDetectionType
+from common.config import DispatchMode
+from common.utilities import logger, config
+from core.data_changed.prev_image_cache import PrevImageCache
+from core.motion_detector.background_subtraction_detector import BackgroundSubtractionDetector
+from core.motion_detector.base_motion_detector import BaseMotionDetector
+from core.motion_detector.block_grid_detector import BlockGridDetector
+from core.motion_detector.imagehash_detector import ImageHashDetector
+from core.motion_detector.opencv_detector import OpenCVDetector
+from core.motion_detector.psnr_detector import PsnrDetector
+
+
+# keeps one detector (and its scratch buffers) per source. A detector is rebuilt only when the md_* settings of its source have changed,
+# which is what a data_changed event of the source brings into the source cache. The detectors of the sources which have not sent a frame
+# for idle_timeout seconds (e.g. the deleted ones) are dropped, since not every worker listens to data_changed
+class MotionDetectorRegistry:
+    def __init__(self, idle_timeout: float = 0.):
+        self.prev_img_cache: PrevImageCache | None = None
+        self.detectors: Dict[str, Tuple[tuple, BaseMotionDetector | None]] = {}
+        self.idle_timeout = idle_timeout  # 0 means never
+        self.last_used: Dict[str, float] = {}
+        self.last_evicted_at: float = time.monotonic()
+
+    def set_prev_img_cache(self, prev_img_cache: PrevImageCache):
+        self.prev_img_cache = prev_img_cache
+        self.detectors.clear()
+        self.last_used.clear()
+
+    @staticmethod
+    def _create_key(source_model: SourceModel) -> tuple:
+        return tuple(value for key, value in source_model.__dict__.items() if key.startswith('md_'))
+
+    def _create_motion_detector(self, source_model: SourceModel) -> BaseMotionDetector | None:
+        if source_model.md_type == MotionDetectionType.OpenCV:
+            return OpenCVDetector(source_model, self.prev_img_cache)
+        elif source_model.md_type == MotionDetectionType.ImageHash:
+            return ImageHashDetector(source_model, self.prev_img_cache)
+        elif source_model.md_type == MotionDetectionType.Psnr:
+            return PsnrDetector(source_model, self.prev_img_cache)
+        elif source_model.md_type == MotionDetectionType.BackgroundSubtraction:
+            if config.snapshot.dispatch_mode == DispatchMode.Pool:
+                logger.warning(f'the background model of source({source_model.id}) is fed only by the frames of this worker, '
+                               f'use the SourceAffinity dispatch mode for background subtraction')
+            return BackgroundSubtractionDetector(source_model, self.prev_img_cache)
+        elif source_model.md_type == MotionDetectionType.BlockGrid:
+            return BlockGridDetector(source_model, self.prev_img_cache)
+        else:
+            logger.warning(f'Motion Detection Type was not found for source({source_model.id})')
+            return None
+
+    def get(self, source_model: SourceModel) -> BaseMotionDetector | None:
+        now = time.monotonic()
+        self.last_used[source_model.id] = now
+        self.__evict_idle(now)
+        key = self._create_key(source_model)
+        item = self.detectors.get(source_model.id)
+        if item is not None and item[0] == key:
+            detector = item[1]
+            if detector is not None:
+                detector.source_model = source_model
+            return detector
+        detector = self._create_motion_detector(source_model)
+        self.detectors[source_model.id] = (key, detector)
+        return detector
+
+    def remove(self, source_id: str):
+        self.detectors.pop(source_id, None)
+        self.last_used.pop(source_id, None)
+
+    def __evict_idle(self, now: float):
+        if self.idle_timeout <= 0. or now - self.last_evicted_at < self.idle_timeout:
+            return
+        self.last_evicted_at = now
+        for source_id in [source_id for source_id, last_used in self.last_used.items() if now - last_used > self.idle_timeout]:
+            self.remove(source_id)
+            logger.info(f'motion detector of source({source_id}) has been removed after {self.idle_timeout} seconds of idle time')
@@ -0,0 +1,24 @@
+import cv2
+import numpy.typing as npt
+
+from core.motion_detector.base_motion_detector import BaseMotionDetector
+
+
+# compares a 32x18 grayscale thumbnail with the one of the last frame which the full detector has run on, with a single SAD.
+# the full detector runs only if the mean absolute difference crosses the threshold, so a static scene costs a tiny decode and a resize
+class MotionPreCheck:
+    size = (32, 18)
+    decode_scale = 8  # the JPEG decoder scales the frame down while decoding, the thumbnail is resized from that one
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+
+    def is_changed(self, md: BaseMotionDetector, img: npt.NDArray) -> bool:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        thumbnail = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        # the thumbnail is kept by the detector, so it is dropped together with the detector when the md settings of the source change
+        prev_thumbnail = md.thumbnail
+        if prev_thumbnail is not None and cv2.norm(prev_thumbnail, thumbnail, cv2.NORM_L1) / thumbnail.size < self.threshold:
+            return False
+        md.thumbnail = thumbnail
+        return True
@@ -6,39 +6,57 @@ import cv2
 from common.data.source_model import SourceModel
 from core.data_changed.prev_image_cache import PrevImageCache
 from core.filters.detections import DetectionBox
-from core.motion_detector.base_motion_detector import BaseMotionDetector, HasMotionResult
+from core.motion_detector.base_motion_detector import PrevImageMotionDetector, HasMotionResult
 
 
-class OpenCVDetector(BaseMotionDetector):
+class OpenCVDetector(PrevImageMotionDetector):
+    kernel = np.ones((5, 5), dtype=np.uint8)
+
     def __init__(self, source_model: SourceModel, prev_img_cache: PrevImageCache):
         super(OpenCVDetector, self).__init__(source_model, prev_img_cache)
         self.ksize = (5, 5)
-        self.kernel = np.ones((5, 5))
+        # scratch buffers, the detector instance is reused per source, so they are allocated once per frame size.
+        # the processed image itself is not one of them since it is stored as the previous image
+        self.diff_frame: npt.NDArray | None = None
+        self.dilated_frame: npt.NDArray | None = None
+        self.thresh_frame: npt.NDArray | None = None
+
+    def __ensure_buffers(self, img: npt.NDArray):
+        if self.diff_frame is None or self.diff_frame.shape != img.shape:
+            self.diff_frame = np.empty_like(img)
+            self.dilated_frame = np.empty_like(img)
+            self.thresh_frame = np.empty_like(img)
 
     def _process_img(self, whole_img: npt.NDArray) -> npt.NDArray:
         # 1. Load image; convert to RGB
         # img_rgb = cv2.cvtColor(src=img_rgb, code=cv2.COLOR_BGR2RGB) ***
         # 2. Prepare image; grayscale and blur
-        prepared_frame = cv2.cvtColor(whole_img, cv2.COLOR_BGR2GRAY)
+        prepared_frame = cv2.cvtColor(whole_img, cv2.COLOR_BGR2GRAY) if whole_img.ndim == 3 else whole_img  # analysis frames are grayscale already
         prepared_frame = cv2.GaussianBlur(src=prepared_frame, ksize=self.ksize, sigmaX=0)
         return prepared_frame
 
     def _has_motion(self, source_model: SourceModel, img_rgb: npt.NDArray, prev_img_rgb: npt.NDArray) -> HasMotionResult:
         threshold = source_model.md_opencv_threshold
         contour_area_limit = source_model.md_contour_area_limit
+        if source_model.md_analysis_scale > 1:  # the limit is given for the full resolution
+            contour_area_limit /= source_model.md_analysis_scale * source_model.md_analysis_scale
+
+        self.__ensure_buffers(img_rgb)
 
         # calculate difference and update previous frame
-        diff_frame = cv2.absdiff(src1=prev_img_rgb, src2=img_rgb)
+        diff_frame = cv2.absdiff(src1=prev_img_rgb, src2=img_rgb, dst=self.diff_frame)
 
         # 4. Dilute the image a bit to make differences more seeable; more suitable for contour detection
-        diff_frame = cv2.dilate(diff_frame, self.kernel, 1)
+        diff_frame = cv2.dilate(diff_frame, self.kernel, dst=self.dilated_frame, iterations=1)
+
+        # the masked pixels never reach the contours, so a swaying tree in a mask can not merge with or crowd out the real motion
+        if self.pixel_mask is not None and self.pixel_mask.shape == diff_frame.shape:
+            diff_frame = cv2.bitwise_and(diff_frame, self.pixel_mask, dst=diff_frame)
 
         # 5. Only take different areas that are different enough (>20 / 255)
-        thresh_frame = cv2.threshold(src=diff_frame, thresh=threshold, maxval=255, type=cv2.THRESH_BINARY)[1]
+        thresh_frame = cv2.threshold(src=diff_frame, thresh=threshold, maxval=255, type=cv2.THRESH_BINARY, dst=self.thresh_frame)[1]
 
-        contours, _ = cv2.findContours(image=thresh_frame, mode=cv2.RETR_EXTERNAL, method=cv2.CHAIN_APPROX_SIMPLE)
         # cv2.drawContours(image=img_rgb, contours=contours, contourIdx=-1, color=(0, 255, 0), thickness=2, lineType=cv2.LINE_AA) ***
-
         contours, _ = cv2.findContours(image=thresh_frame, mode=cv2.RETR_EXTERNAL, method=cv2.CHAIN_APPROX_SIMPLE)
         boxes: List[DetectionBox] = []
         for contour in contours:
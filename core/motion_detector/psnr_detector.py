@@ -4,10 +4,10 @@ import numpy.typing as npt
 from common.data.source_model import SourceModel
 from core.data_changed.prev_image_cache import PrevImageCache
 
-from core.motion_detector.base_motion_detector import BaseMotionDetector, HasMotionResult
+from core.motion_detector.base_motion_detector import PrevImageMotionDetector, HasMotionResult
 
 
-class PsnrDetector(BaseMotionDetector):
+class PsnrDetector(PrevImageMotionDetector):
     def __init__(self, source_model: SourceModel, prev_img_cache: PrevImageCache):
         super(PsnrDetector, self).__init__(source_model, prev_img_cache)
 
@@ -6,9 +6,13 @@ from redis.client import Redis
 
 from common.data.heartbeat_repository import HeartbeatRepository
 from common.data.service_repository import ServiceRepository
+from common.config import TransportType
 from common.event_bus.event_bus import EventBus
-from common.utilities import crate_redis_connection, RedisDb, logger
+from common.event_bus.stream_event_bus import StreamEventBus
+from common.utilities import crate_redis_connection, RedisDb, logger, config
+from core.data_changed.od.od_cache import OdCache
 from core.data_changed.prev_image_cache import PrevImageCache
+from core.data_changed.source_cache import SourceCache
 from core.event_handlers.channel_names import EventChannels
 from core.event_handlers.data_changed_event_handler import DataChangedEventHandler
 
@@ -22,12 +26,14 @@ def register_detect_service(service_name: str, instance_name: str, description:
     return connection_main
 
 
-def listen_data_changed_event_async(connection: Redis, prev_image_cache: PrevImageCache, source_cache: dict, od_cache: dict):
+def listen_data_changed_event_async(connection: Redis, prev_image_cache: PrevImageCache, source_cache: dict, od_cache: dict, daemon: bool = False,
+                                    on_applied: Callable[[str], None] | None = None, refresh_caches: bool = True,
+                                    on_subscribed: Callable | None = None):
     def fn():
         while 1:
             event_bus = None
             try:
-                handler = DataChangedEventHandler(connection, prev_image_cache)
+                handler = DataChangedEventHandler(connection, prev_image_cache, on_applied, refresh_caches, on_subscribed)
                 handler.source_cache.set_dict(source_cache)
                 handler.od_cache.set_dict(od_cache)
                 event_bus = EventBus(EventChannels.data_changed)
@@ -43,7 +49,41 @@ def listen_data_changed_event_async(connection: Redis, prev_image_cache: PrevIma
             time.sleep(1.)
             fn()
 
-    start_thread(fn, False)
+    start_thread(fn, daemon)
+
+
+# the caches of a worker are plain dicts (copied on fork) when the local cache is enabled, each worker keeps its own ones up to date.
+# Otherwise they are the Manager dicts which the main process refreshes, a worker listens only if it has its own previous images (always)
+def listen_data_changed_event_in_worker(connection: Redis, prev_image_cache: PrevImageCache, always: bool):
+    generation = SourceCache.generation
+    if generation is None and not always:
+        return
+    listen_data_changed_event_async(connection, prev_image_cache, SourceCache.dic, OdCache.dic, True,
+                                    (lambda source_id: generation.apply()) if generation is not None else None, generation is not None)
+
+
+def create_event_bus(channel: str) -> EventBus:
+    snapshot_config = config.snapshot
+    if snapshot_config.transport == TransportType.Streams:
+        return StreamEventBus(channel, snapshot_config.stream_group_name, snapshot_config.stream_max_len, snapshot_config.stream_claim_min_idle,
+                              snapshot_config.stream_read_count, snapshot_config.stream_block, claim_max_age=snapshot_config.stream_claim_max_age)
+    return EventBus(channel)
+
+
+# fills the caches before the subscribers start, so that the first frames of all cameras do not miss at once. The data_changed listener is
+# already running, so only the missing models are added, the ones which it has loaded meanwhile are newer
+def warm_up_caches(connection: Redis, source_cache_dic: dict, od_cache_dic: dict, batch_size: int):
+    start = time.perf_counter()
+    source_cache = SourceCache(connection)
+    source_cache.set_dict(source_cache_dic)
+    od_cache = OdCache(connection, source_cache)
+    od_cache.set_dict(od_cache_dic)
+    try:
+        source_count = source_cache.warm_up(batch_size)
+        od_count = od_cache.warm_up(batch_size)
+        logger.warning(f'caches have been warmed up in {time.perf_counter() - start:.3f} seconds, sources: {source_count}, ods: {od_count}')
+    except BaseException as ex:
+        logger.error(f'an error occurred while warming up the caches, ex: {ex}')
 
 
 def generate_id() -> str:
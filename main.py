@@ -1,46 +1,95 @@
 import time
 from multiprocessing import Manager
+from threading import Event
 
-from common.utilities import logger
+from common.config import PrevImageCacheType, DispatchMode
+from common.event_bus.event_handler import EventHandler
+from common.utilities import logger, config
+from core.data_changed.cache_generation import CacheGeneration
 from core.data_changed.prev_image_cache import PrevImageCache
+from core.data_changed.shared_memory_prev_image_cache import SharedMemoryPrevImageCache
 from core.event_handlers.channel_names import EventChannels
-from core.event_handlers.in_filter_event_handler import InFilterEventHandler
+from core.event_handlers.in_filter_event_handler import InFilterEventHandler, create_frame_admission
 from common.event_bus.event_bus import EventBus
 from core.event_handlers.out_filter_event_handler import OutFilterEventHandler
-from core.utilities import register_detect_service, listen_data_changed_event_async, start_thread
+from core.utilities import register_detect_service, listen_data_changed_event_async, start_thread, create_event_bus, warm_up_caches
+
+
+# ordered subscriptions are handled on the subscriber thread, the sharded pool needs it to keep the frames of a source in order
+def subscribe(event_bus: EventBus, handler: EventHandler, ordered: bool = False):
+    snapshot_config = config.snapshot
+    if ordered:
+        if snapshot_config.dispatcher_enabled:
+            logger.warning(f'the dispatcher is not used for {event_bus.channel} in the SourceAffinity dispatch mode')
+        event_bus.subscribe_sync(handler)
+    elif snapshot_config.dispatcher_enabled:
+        event_bus.subscribe_bounded(handler, snapshot_config.dispatcher_thread_count, snapshot_config.dispatcher_queue_size,
+                                    snapshot_config.dispatcher_overflow_policy)
+    else:
+        event_bus.subscribe_async(handler)
+
+
+def create_prev_image_cache(manager) -> PrevImageCache:
+    snapshot_config = config.snapshot
+    if snapshot_config.prev_image_cache_type == PrevImageCacheType.SharedMemory:
+        slot_size = snapshot_config.prev_image_max_width * snapshot_config.prev_image_max_height * max(snapshot_config.prev_image_channels, 1)
+        return SharedMemoryPrevImageCache(snapshot_config.prev_image_slot_count, slot_size)
+    return PrevImageCache(manager.dict())
 
 
 def main():
     conn = register_detect_service('snapshot_service', 'snapshot_service-instance', 'The Snapshot Service®')
     with Manager() as manager:
-        prev_image_cache = PrevImageCache(manager.dict())
-        source_cache_dic = manager.dict()
-        od_cache_dic = manager.dict()
-        listen_data_changed_event_async(conn, prev_image_cache, source_cache_dic, od_cache_dic)
+        prev_image_cache = create_prev_image_cache(manager)
+        cache_generation: CacheGeneration | None = None
+        if config.snapshot.local_cache_enabled:
+            source_cache_dic, od_cache_dic = {}, {}
+            cache_generation = CacheGeneration(config.snapshot.local_cache_grace_period)
+        else:
+            source_cache_dic, od_cache_dic = manager.dict(), manager.dict()
+        admission = create_frame_admission()
+
+        def on_applied(source_id: str):
+            if cache_generation is not None:
+                cache_generation.increment()
+            if admission is not None:
+                admission.remove(source_id)
+
+        # the listener subscribes before the warm up reads the models, so no change is lost in between
+        subscribed = Event()
+        listen_data_changed_event_async(conn, prev_image_cache, source_cache_dic, od_cache_dic, on_applied=on_applied, on_subscribed=subscribed.set)
+        if not subscribed.wait(10.):
+            logger.warning('data changed event subscription has not been confirmed yet, the caches are warmed up anyway')
+        warm_up_caches(conn, source_cache_dic, od_cache_dic, config.snapshot.warm_up_batch_size)
 
+        # reconnects in a loop instead of a recursion, the subscription stops its dispatcher before it returns
         def fn_in():
-            try:
-                with InFilterEventHandler(prev_image_cache, source_cache_dic, od_cache_dic) as handler:
-                    event_bus = EventBus(EventChannels.read_service)
-                    event_bus.subscribe_async(handler)
-            except BaseException as ex:
-                logger.error(f'an error occurred while listening InFilterEventHandler, ex: {ex}')
+            while True:
+                try:
+                    with InFilterEventHandler(prev_image_cache, source_cache_dic, od_cache_dic, cache_generation, admission) as handler:
+                        event_bus = create_event_bus(EventChannels.read_service)
+                        subscribe(event_bus, handler, config.snapshot.dispatch_mode == DispatchMode.SourceAffinity)
+                except BaseException as ex:
+                    logger.error(f'an error occurred while listening InFilterEventHandler, ex: {ex}')
                 time.sleep(1.)
-                fn_in()
 
         start_thread(fn_in, True)
 
         def fn_out():
-            try:
-                with OutFilterEventHandler(source_cache_dic, od_cache_dic) as handler:
-                    event_bus = EventBus(EventChannels.snapshot_out)
-                    event_bus.subscribe_async(handler)
-            except BaseException as ex:
-                logger.error(f'an error occurred while listening OutFilterEventHandler, ex: {ex}')
+            while True:
+                try:
+                    with OutFilterEventHandler(source_cache_dic, od_cache_dic, cache_generation) as handler:
+                        event_bus = create_event_bus(EventChannels.snapshot_out)
+                        subscribe(event_bus, handler)
+                except BaseException as ex:
+                    logger.error(f'an error occurred while listening OutFilterEventHandler, ex: {ex}')
                 time.sleep(1.)
-                fn_out()
 
-        fn_out()
+        try:
+            fn_out()
+        finally:
+            if isinstance(prev_image_cache, SharedMemoryPrevImageCache):
+                prev_image_cache.close(True)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,55 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from core.filters.detections import DetectionBox
+from core.filters.messages import InMessage
+
+
+def create_box(x1: int, y1: int, x2: int, y2: int) -> DetectionBox:
+    box = DetectionBox()
+    box.x1, box.y1, box.x2, box.y2 = x1, y1, x2, y2
+    return box
+
+
+def create_message(width: int, height: int) -> InMessage:
+    buffered = io.BytesIO()
+    Image.fromarray(np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)).save(buffered, format='JPEG')
+    message = InMessage()
+    message.set_frame_bytes(buffered.getvalue())
+    return message
+
+
+def test_box_is_scaled_outwards():
+    box = create_box(10, 11, 20, 21)
+    box.scale(1.5, 2.5, 1000, 1000)
+    assert (box.x1, box.y1, box.x2, box.y2) == (15, 27, 30, 53)
+
+
+def test_scaled_box_is_clamped_to_the_frame():
+    box = create_box(0, 0, 160, 120)
+    box.scale(4.01, 4.01, 640, 480)
+    assert (box.x1, box.y1, box.x2, box.y2) == (0, 0, 640, 480)
+
+
+def test_analysis_image_is_decoded_in_grayscale_at_the_reduced_size():
+    img, fx, fy = create_message(640, 480).create_analysis_img(4)
+
+    assert img.shape == (120, 160)
+    assert img.dtype == np.uint8
+    assert (fx, fy) == (4., 4.)
+
+
+def test_analysis_image_of_a_broken_frame_is_none():
+    message = InMessage()
+    message.set_frame_bytes(b'not a jpeg')
+    img, fx, fy = message.create_analysis_img(4)
+    assert img is None and (fx, fy) == (1., 1.)
+
+
+def test_box_of_the_analysis_image_covers_the_same_area_of_the_frame():
+    img, fx, fy = create_message(1000, 750).create_analysis_img(8)
+    box = create_box(0, 0, img.shape[1], img.shape[0])
+    box.scale(fx, fy, round(img.shape[1] * fx), round(img.shape[0] * fy))
+    assert (box.x2, box.y2) == (1000, 750)
@@ -0,0 +1,60 @@
+import numpy as np
+
+from common.data.source_model import SourceModel, MotionDetectionType
+from core.data_changed.prev_image_cache import PrevImageCache
+from core.motion_detector.block_grid_detector import BlockGridDetector
+
+
+def create_detector() -> BlockGridDetector:
+    source_model = SourceModel()
+    source_model.id = 'cam'
+    source_model.md_type = MotionDetectionType.BlockGrid
+    source_model.md_grid_columns = 16
+    source_model.md_grid_rows = 9
+    source_model.md_grid_threshold = 12.
+    return BlockGridDetector(source_model, PrevImageCache({}))
+
+
+def create_frame() -> np.ndarray:
+    return np.full((360, 640), 50, dtype=np.uint8)
+
+
+def test_first_and_unchanged_frames_have_no_motion():
+    detector = create_detector()
+    assert not detector.has_motion(create_frame()).has_motion
+    assert not detector.has_motion(create_frame()).has_motion
+
+
+def test_changed_region_becomes_a_box_which_covers_it():
+    detector = create_detector()
+    detector.has_motion(create_frame())
+    frame = create_frame()
+    frame[100:180, 200:320] = 250
+
+    ret = detector.has_motion(frame)
+    assert ret.has_motion
+    assert len(ret.detection_boxes) == 1
+    b = ret.detection_boxes[0]
+    assert b.x1 <= 200 and b.y1 <= 100 and b.x2 >= 320 and b.y2 >= 180
+    # no further than a cell (40 x 40 pixels) from the region
+    assert b.x1 > 200 - 40 and b.y1 > 100 - 40 and b.x2 < 320 + 40 and b.y2 < 180 + 40
+    assert ret.motion_map.shape == (9, 16)
+
+
+def test_separate_regions_become_separate_boxes():
+    detector = create_detector()
+    detector.has_motion(create_frame())
+    frame = create_frame()
+    frame[0:40, 0:40] = 250
+    frame[320:360, 600:640] = 250
+
+    ret = detector.has_motion(frame)
+    assert sorted((b.x1, b.y1, b.x2, b.y2) for b in ret.detection_boxes) == [(0, 0, 40, 40), (600, 320, 640, 360)]
+
+
+def test_small_change_is_under_the_threshold():
+    detector = create_detector()
+    detector.has_motion(create_frame())
+    frame = create_frame()
+    frame[100:104, 200:204] = 250
+    assert not detector.has_motion(frame).has_motion
@@ -0,0 +1,100 @@
+import time
+from threading import Event, Thread, Lock
+
+from common.config import OverflowPolicy
+from common.event_bus.bounded_dispatcher import BoundedDispatcher
+
+
+class BlockingConsumer:
+    def __init__(self):
+        self.release = Event()
+        self.started = Event()
+        self.items = []
+        self.lock = Lock()
+
+    def __call__(self, item):
+        self.started.set()
+        self.release.wait(5.)
+        with self.lock:
+            self.items.append(item)
+
+
+def wait_for(predicate, timeout: float = 5.):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(.01)
+    return predicate()
+
+
+# the consumer holds the first item, so the next ones stay in the queue of 2 items
+def fill(overflow_policy: OverflowPolicy, dropped: list) -> (BoundedDispatcher, BlockingConsumer):
+    consumer = BlockingConsumer()
+    dispatcher = BoundedDispatcher('test', consumer, 1, 2, overflow_policy, dropped.append)
+    dispatcher.start()
+    dispatcher.put(0)
+    assert consumer.started.wait(5.)
+    dispatcher.put(1)
+    dispatcher.put(2)
+    return dispatcher, consumer
+
+
+def test_drop_oldest_replaces_the_oldest_queued_item():
+    dropped = []
+    dispatcher, consumer = fill(OverflowPolicy.DropOldest, dropped)
+    dispatcher.put(3)
+    consumer.release.set()
+
+    assert wait_for(lambda: len(consumer.items) == 3)
+    assert consumer.items == [0, 2, 3]
+    assert dropped == [1]
+    assert dispatcher.stats.dropped_oldest_count == 1
+    dispatcher.stop()
+
+
+def test_drop_newest_discards_the_new_item():
+    dropped = []
+    dispatcher, consumer = fill(OverflowPolicy.DropNewest, dropped)
+    dispatcher.put(3)
+    consumer.release.set()
+
+    assert wait_for(lambda: len(consumer.items) == 3)
+    assert consumer.items == [0, 1, 2]
+    assert dropped == [3]
+    assert dispatcher.stats.dropped_newest_count == 1
+    dispatcher.stop()
+
+
+def test_block_waits_for_a_free_place():
+    dropped = []
+    dispatcher, consumer = fill(OverflowPolicy.Block, dropped)
+    th = Thread(target=dispatcher.put, args=(3,), daemon=True)
+    th.start()
+    th.join(.2)
+    assert th.is_alive()
+
+    consumer.release.set()
+    th.join(5.)
+    assert wait_for(lambda: len(consumer.items) == 4)
+    assert consumer.items == [0, 1, 2, 3]
+    assert dropped == []
+    dispatcher.stop()
+
+
+def test_failed_item_is_counted_and_the_next_one_is_dispatched():
+    items = []
+
+    def fn(item):
+        if item == 0:
+            raise ValueError('broken message')
+        items.append(item)
+
+    dispatcher = BoundedDispatcher('test', fn, 1, 2, OverflowPolicy.Block)
+    dispatcher.start()
+    dispatcher.put(0)
+    dispatcher.put(1)
+
+    assert wait_for(lambda: items == [1])
+    assert dispatcher.stats.failed_count == 1
+    dispatcher.stop()
@@ -0,0 +1,61 @@
+from common.data.source_model import SourceModel
+from core.event_handlers.frame_admission import FrameAdmission
+
+
+class FakeSourceCache:
+    def __init__(self, snapshot_frame_rate: int):
+        self.snapshot_frame_rate = snapshot_frame_rate
+        self.get_count = 0
+
+    def get(self, source_id: str) -> SourceModel:
+        self.get_count += 1
+        ret = SourceModel()
+        ret.id, ret.snapshot_frame_rate = source_id, self.snapshot_frame_rate
+        return ret
+
+
+def test_frames_faster_than_the_source_rate_are_dropped():
+    admission = FrameAdmission(FakeSourceCache(1), .8, 0)
+    assert [admission.admit('cam') for _ in range(3)] == [True, False, False]
+    admission.stats['cam'].last_time -= .9
+    assert admission.admit('cam') is True
+    assert admission.get_stats() == {'cam': {'admitted_count': 2, 'dropped_count': 2}}
+
+
+def test_jitter_within_the_tolerance_is_admitted():
+    admission = FrameAdmission(FakeSourceCache(1), .8, 0)
+    assert admission.admit('cam') is True
+    admission.stats['cam'].last_time -= .85  # a frame which is early by 15% of its interval
+    assert admission.admit('cam') is True
+
+
+def test_max_fps_caps_the_source_rate():
+    assert FrameAdmission(FakeSourceCache(25), 1., 0, max_fps=5.).get_rate('cam') == 5.
+    assert FrameAdmission(FakeSourceCache(2), 1., 0, max_fps=5.).get_rate('cam') == 2.
+    assert FrameAdmission(FakeSourceCache(0), 1., 0, max_fps=5.).get_rate('cam') == 5.
+
+
+def test_every_frame_is_admitted_without_a_rate():
+    admission = FrameAdmission(FakeSourceCache(0), .8, 0)
+    assert all(admission.admit('cam') for _ in range(10))
+
+
+def test_only_max_fps_is_used_without_a_source_cache():
+    assert FrameAdmission(None, .8, 0).get_rate('cam') == 0.
+    admission = FrameAdmission(None, .8, 0, max_fps=2.)
+    assert admission.get_rate('cam') == 2.
+    assert [admission.admit('cam') for _ in range(2)] == [True, False]
+
+
+def test_rate_is_read_once_per_source_until_it_is_removed():
+    source_cache = FakeSourceCache(1)
+    admission = FrameAdmission(source_cache, .8, 0)
+    for _ in range(5):
+        admission.admit('cam')
+    assert source_cache.get_count == 1
+
+    source_cache.snapshot_frame_rate = 4
+    assert admission.get_rate('cam') == 1.
+    admission.remove('cam')
+    assert admission.get_rate('cam') == 4.
+    assert source_cache.get_count == 2
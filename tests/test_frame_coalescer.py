@@ -0,0 +1,89 @@
+import time
+from threading import Event, Lock
+
+from core.event_handlers.frame_coalescer import FrameCoalescer
+
+
+def wait_for(predicate, timeout: float = 5.):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(.01)
+    return predicate()
+
+
+# accepts one frame at a time, like a consumer without capacity until release is set
+class GatedConsumer:
+    def __init__(self, accept: bool = True):
+        self.accept = accept
+        self.release = Event()
+        self.started = Event()
+        self.items = []
+        self.lock = Lock()
+
+    def __call__(self, source_id: str, item) -> bool:
+        self.started.set()
+        self.release.wait(5.)
+        with self.lock:
+            self.items.append((source_id, item))
+        return self.accept
+
+
+def test_latest_pending_frame_of_a_source_wins():
+    consumer = GatedConsumer()
+    dropped = []
+    coalescer = FrameCoalescer(consumer, 0., 0, dropped.append)
+    coalescer.start()
+    coalescer.put('cam', 0)
+    assert consumer.started.wait(5.)
+    for i in range(1, 10):
+        coalescer.put('cam', i)
+    consumer.release.set()
+
+    assert wait_for(lambda: len(consumer.items) == 2)
+    assert consumer.items == [('cam', 0), ('cam', 9)]
+    assert dropped == list(range(1, 9))
+    stats = coalescer.get_stats()['cam']
+    assert stats['received_count'] == 10 and stats['coalesced_count'] == 8 and stats['forwarded_count'] == 2
+
+
+def test_pending_frames_of_the_sources_do_not_replace_each_other():
+    consumer = GatedConsumer()
+    coalescer = FrameCoalescer(consumer, 0., 0)
+    coalescer.start()
+    coalescer.put('a', 0)
+    assert consumer.started.wait(5.)
+    coalescer.put('a', 1)
+    coalescer.put('b', 2)
+    consumer.release.set()
+
+    assert wait_for(lambda: len(consumer.items) == 3)
+    assert consumer.items == [('a', 0), ('a', 1), ('b', 2)]
+
+
+def test_frame_which_is_not_accepted_is_not_counted_as_forwarded():
+    consumer = GatedConsumer(False)
+    consumer.release.set()
+    coalescer = FrameCoalescer(consumer, 0., 0)
+    coalescer.start()
+    coalescer.put('cam', 0)
+
+    assert wait_for(lambda: coalescer.get_stats()['cam']['dropped_count'] == 1)
+    assert coalescer.get_stats()['cam']['forwarded_count'] == 0
+
+
+def test_too_old_frame_is_dropped():
+    consumer = GatedConsumer()
+    dropped = []
+    coalescer = FrameCoalescer(consumer, .05, 0, dropped.append)
+    coalescer.start()
+    coalescer.put('a', 0)
+    assert consumer.started.wait(5.)
+    coalescer.put('b', 1)
+    time.sleep(.1)
+    consumer.release.set()
+
+    assert wait_for(lambda: dropped == [1])
+    assert consumer.items == [('a', 0)]
+    assert coalescer.get_stats()['b']['dropped_count'] == 1
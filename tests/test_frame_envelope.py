@@ -0,0 +1,67 @@
+import base64
+import json
+import struct
+
+import pytest
+
+from core.filters.frame_envelope import FrameEnvelope
+from core.filters.messages import InMessage
+
+
+def create_envelope() -> FrameEnvelope:
+    envelope = FrameEnvelope()
+    envelope.source_id = 'camera-ğ1'
+    envelope.name = 'front door'
+    envelope.meta = {'roi': {'x': 1, 'y': 2}}
+    envelope.image_bytes = b'\xff\xd8\xff' + bytes(range(256)) + b'\xff\xd9'
+    envelope.set_ai_clip_enabled(True)
+    return envelope
+
+
+def test_envelope_round_trip():
+    data = create_envelope().pack()
+
+    assert FrameEnvelope.is_envelope(data)
+    envelope = FrameEnvelope.unpack(data)
+    assert envelope.source_id == 'camera-ğ1'
+    assert envelope.name == 'front door'
+    assert envelope.meta == {'roi': {'x': 1, 'y': 2}}
+    assert envelope.image_bytes == create_envelope().image_bytes
+    assert envelope.is_ai_clip_enabled()
+
+
+def test_envelope_without_meta():
+    envelope = create_envelope()
+    envelope.meta = {}
+    envelope.set_ai_clip_enabled(False)
+
+    ret = FrameEnvelope.unpack(envelope.pack())
+    assert ret.meta == {}
+    assert not ret.is_ai_clip_enabled()
+    assert ret.image_bytes == envelope.image_bytes
+
+
+def test_source_id_is_peeked_without_unpacking():
+    assert FrameEnvelope.peek_source_id(create_envelope().pack()) == 'camera-ğ1'
+
+
+def test_newer_envelope_version_is_rejected():
+    data = bytearray(create_envelope().pack())
+    struct.pack_into('<B', data, 4, FrameEnvelope.version + 1)
+    with pytest.raises(ValueError):
+        FrameEnvelope.unpack(bytes(data))
+
+
+def test_in_message_reads_both_formats():
+    envelope = create_envelope()
+    legacy = {'name': envelope.name, 'source': envelope.source_id, 'img': base64.b64encode(envelope.image_bytes).decode(),
+              'ai_clip_enabled': True}
+    for data in (envelope.pack(), json.dumps(legacy).encode()):
+        dic = {'data': data}
+        assert InMessage.peek_source_id(dic) == envelope.source_id
+        message = InMessage()
+        message.form_dic(dic)
+        assert message.source_id == envelope.source_id
+        assert message.name == envelope.name
+        assert message.ai_clip_enabled
+        assert message.image_bytes == envelope.image_bytes
@@ -0,0 +1,51 @@
+import random
+
+import numpy as np
+from shapely.geometry import Polygon, box
+
+from core.data_changed.od.geometry_index import GeometryIndex
+from core.filters.detections import DetectionBox
+
+
+def create_box(x1: int, y1: int, x2: int, y2: int) -> DetectionBox:
+    ret = DetectionBox()
+    ret.x1, ret.y1, ret.x2, ret.y2 = x1, y1, x2, y2
+    return ret
+
+
+def create_random_boxes(rnd: random.Random, count: int) -> list:
+    ret = []
+    for _ in range(count):
+        x, y = rnd.randint(0, 600), rnd.randint(0, 440)
+        ret.append(create_box(x, y, x + rnd.randint(1, 80), y + rnd.randint(1, 80)))
+    return ret
+
+
+def create_random_polygon(rnd: random.Random) -> Polygon:
+    cx, cy, r = rnd.randint(50, 590), rnd.randint(50, 430), rnd.randint(10, 60)
+    angles = sorted(rnd.uniform(0, 2 * np.pi) for _ in range(rnd.randint(3, 8)))
+    return Polygon([(cx + r * np.cos(a), cy + r * np.sin(a)) for a in angles])
+
+
+def brute_force(polygons: list, boxes: list) -> np.ndarray:
+    return np.array([any(polygon.intersects(box(b.x1, b.y1, b.x2, b.y2)) for polygon in polygons if polygon.length > 0) for b in boxes],
+                    dtype=bool)
+
+
+def test_index_matches_the_brute_force_test():
+    rnd = random.Random(7)
+    for _ in range(20):
+        polygons = [create_random_polygon(rnd) for _ in range(rnd.randint(1, 6))]
+        boxes = create_random_boxes(rnd, 50)
+        assert np.array_equal(GeometryIndex(polygons).intersects(boxes), brute_force(polygons, boxes))
+
+
+def test_empty_polygons_and_boxes():
+    assert GeometryIndex([Polygon([])]).intersects([create_box(0, 0, 10, 10)]).tolist() == [False]
+    assert GeometryIndex([Polygon([(0, 0), (10, 0), (10, 10)])]).intersects([]).tolist() == []
+
+
+def test_touching_box_intersects():
+    polygons = [Polygon([(0, 0), (10, 0), (10, 10), (0, 10)])]
+    boxes = [create_box(10, 0, 20, 10), create_box(11, 0, 20, 10)]
+    assert GeometryIndex(polygons).intersects(boxes).tolist() == [True, False]
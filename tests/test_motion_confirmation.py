@@ -0,0 +1,71 @@
+import json
+from typing import List
+
+import pytest
+
+from common.config import SnapshotConfig, DispatchMode
+from core.motion_detector.motion_confirmation import MotionConfirmation
+
+
+def create_config(forward_interval: float = 0.) -> SnapshotConfig:
+    ret = SnapshotConfig()
+    ret.dispatch_mode = DispatchMode.SourceAffinity
+    ret.md_confirmation_count = 2
+    ret.md_confirmation_window = 3
+    ret.md_episode_forward_interval = forward_interval
+    ret.md_episode_idle_timeout = 0.
+    return ret
+
+
+def get_events(events: List[str]) -> List[str]:
+    return [json.loads(e)['event'] for e in events]
+
+
+def test_it_requires_the_source_affinity_dispatch_mode():
+    snapshot_config = create_config()
+    snapshot_config.dispatch_mode = DispatchMode.Pool
+    with pytest.raises(ValueError):
+        MotionConfirmation(snapshot_config)
+
+
+def test_a_single_noisy_frame_is_not_forwarded():
+    events = []
+    confirmation = MotionConfirmation(create_config(), events.append)
+    assert [confirmation.update('cam', m) for m in (True, False, False, True, False, False)] == [False] * 6
+    assert events == []
+
+
+def test_episode_starts_after_count_of_window_frames_and_ends_without_motion():
+    events = []
+    confirmation = MotionConfirmation(create_config(), events.append)
+    assert [confirmation.update('cam', m) for m in (True, False, True, True)] == [False, False, True, True]
+    assert get_events(events) == ['started']
+
+    assert [confirmation.update('cam', m) for m in (False, False, False)] == [False, False, False]
+    assert get_events(events) == ['started', 'ended']
+    dic = json.loads(events[1])
+    assert dic['source_id'] == 'cam' and dic['forwarded_count'] == 2
+
+
+def test_sources_are_confirmed_separately():
+    confirmation = MotionConfirmation(create_config())
+    assert confirmation.update('cam1', True) is False
+    assert confirmation.update('cam2', True) is False
+    assert confirmation.update('cam1', True) is True
+
+
+def test_episode_frames_are_forwarded_once_per_interval():
+    confirmation = MotionConfirmation(create_config(forward_interval=60.))
+    assert [confirmation.update('cam', True) for _ in range(5)] == [False, True, False, False, False]
+
+
+def test_idle_episodes_are_ended_by_expire():
+    events = []
+    confirmation = MotionConfirmation(create_config(), events.append)
+    confirmation.update('cam', True)
+    confirmation.update('cam', True)
+    confirmation.idle_timeout = 5.
+    confirmation.episodes['cam'].last_seen_at -= 10.
+    confirmation.expire()
+    assert get_events(events) == ['started', 'ended']
+    assert 'cam' not in confirmation.episodes
@@ -0,0 +1,43 @@
+import numpy as np
+
+from common.data.source_model import SourceModel
+from core.data_changed.prev_image_cache import PrevImageCache
+from core.motion_detector.block_grid_detector import BlockGridDetector
+from core.motion_detector.motion_pre_check import MotionPreCheck
+
+
+def create_detector() -> BlockGridDetector:
+    source_model = SourceModel()
+    source_model.id = 'cam'
+    return BlockGridDetector(source_model, PrevImageCache({}))
+
+
+def test_first_frame_is_changed():
+    assert MotionPreCheck(2.).is_changed(create_detector(), np.zeros((90, 160), dtype=np.uint8))
+
+
+def test_static_scene_is_not_changed():
+    pre_check, md = MotionPreCheck(2.), create_detector()
+    frame = np.random.default_rng(3).integers(0, 255, (90, 160, 3), dtype=np.uint8)
+    pre_check.is_changed(md, frame)
+    noisy = np.clip(frame.astype(np.int16) + 1, 0, 255).astype(np.uint8)
+    assert not pre_check.is_changed(md, noisy)
+
+
+def test_changed_scene_replaces_the_thumbnail():
+    pre_check, md = MotionPreCheck(2.), create_detector()
+    pre_check.is_changed(md, np.zeros((90, 160), dtype=np.uint8))
+    changed = np.zeros((90, 160), dtype=np.uint8)
+    changed[:, :80] = 200
+
+    assert pre_check.is_changed(md, changed)
+    assert md.thumbnail.shape == (18, 32)
+    assert not pre_check.is_changed(md, changed)
+
+
+# the thumbnail of the last frame which has passed is kept, so a slow drift is still caught once it adds up
+def test_slow_drift_adds_up():
+    pre_check, md = MotionPreCheck(2.), create_detector()
+    pre_check.is_changed(md, np.zeros((90, 160), dtype=np.uint8))
+    ret = [pre_check.is_changed(md, np.full((90, 160), value, dtype=np.uint8)) for value in range(1, 4)]
+    assert ret == [False, True, False]
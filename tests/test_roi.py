@@ -0,0 +1,104 @@
+import io
+import json
+import uuid
+
+import numpy as np
+import pytest
+from PIL import Image
+from redis import Redis
+from redis.exceptions import ConnectionError
+
+from common.config import config_redis, FrameFormat
+from common.utilities import config
+from core.filters.detections import DetectionBox
+from core.filters.messages import InMessage, OutMessage
+from core.filters.roi_frame_store import RoiFrameStore
+from core.motion_detector.box_merger import create_rois
+
+
+@pytest.fixture
+def frame_store():
+    conn = Redis(host=config_redis.host, port=config_redis.port, db=15)
+    try:
+        conn.ping()
+    except ConnectionError:
+        pytest.skip(f'no redis server on {config_redis.host}:{config_redis.port}')
+    store = RoiFrameStore(conn, 30)
+    store.prefix = f'test_roi_frames_{uuid.uuid4().hex}:'
+    yield store
+    for key in conn.scan_iter(match=f'{store.prefix}*'):
+        conn.delete(key)
+    conn.close()
+
+
+@pytest.fixture
+def json_format():
+    snapshot_config = config.snapshot
+    publish_format, roi_crop_max_area_ratio = snapshot_config.publish_format, snapshot_config.roi_crop_max_area_ratio
+    snapshot_config.publish_format = FrameFormat.Json
+    snapshot_config.roi_crop_max_area_ratio = .5
+    yield
+    snapshot_config.publish_format, snapshot_config.roi_crop_max_area_ratio = publish_format, roi_crop_max_area_ratio
+
+
+def create_box(x1: int, y1: int, x2: int, y2: int) -> DetectionBox:
+    ret = DetectionBox()
+    ret.x1, ret.y1, ret.x2, ret.y2 = x1, y1, x2, y2
+    return ret
+
+
+def create_in_message(boxes: list) -> InMessage:
+    buffered = io.BytesIO()
+    Image.fromarray(np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)).save(buffered, format='JPEG')
+    message = InMessage()
+    message.source_id, message.name = 'cam', 'front'
+    message.set_frame_bytes(buffered.getvalue())
+    message.detection_boxes = boxes
+    return message
+
+
+# what a detection service sends back for a crop, a detection at (1, 1, 5, 5) of the crop
+def create_out_message(data: str) -> OutMessage:
+    dic = json.loads(data)
+    dic.update({'source': dic['source_id'], 'img': dic['base64_image'], 'channel': 'od_service', 'list_name': 'detected_objects',
+                'detections': [{'pred_cls_name': 'person', 'pred_cls_idx': 0, 'pred_score': .9, 'box': {'x1': 1, 'y1': 1, 'x2': 5, 'y2': 5}}]})
+    message = OutMessage()
+    message.form_dic({'data': json.dumps(dic).encode()})
+    return message
+
+
+def test_rois_are_padded_merged_and_clamped():
+    rois = create_rois([create_box(10, 10, 20, 20), create_box(25, 10, 35, 20), create_box(300, 300, 310, 310)], 8, 2, 320, 320)
+    assert sorted((b.x1, b.y1, b.x2, b.y2) for b in rois) == [(2, 2, 43, 28), (292, 292, 318, 318)]
+
+
+def test_rois_are_reduced_to_max_count():
+    boxes = [create_box(x, 10, x + 10, 20) for x in (0, 100, 200)]
+    rois = create_rois(boxes, 0, 2, 320, 320)
+    assert len(rois) == 2
+    for b in boxes:
+        assert any(r.x1 <= b.x1 and r.y1 <= b.y1 and r.x2 >= b.x2 and r.y2 >= b.y2 for r in rois)
+
+
+def test_detections_of_all_crops_are_published_once_with_the_whole_frame(frame_store: RoiFrameStore, json_format):
+    in_message = create_in_message([create_box(100, 100, 140, 140), create_box(500, 300, 540, 340)])
+    data_list = in_message.create_roi_publish_list(frame_store)
+    assert len(data_list) == 2
+
+    out_messages = [create_out_message(data) for data in data_list]
+    merged = [frame_store.add_detections(m.roi['frame_id'], m.channel, m.create_detection_dics(), m.roi['count']) for m in out_messages]
+    assert merged[0] is None
+    assert sorted((d['box']['x1'], d['box']['y1']) for d in merged[1]) == [(69, 69), (469, 269)]
+
+    message = out_messages[1]
+    message.restore_frame(frame_store.get(message.roi['frame_id']), [OutMessage.create_detection(d) for d in merged[1]])
+    assert message.pil_image.size == (640, 480)
+    assert len(message.detections) == 2
+    assert 'roi' not in json.loads(message.create_publish_dic())
+
+
+def test_whole_frame_is_published_if_the_crops_cover_most_of_it(frame_store: RoiFrameStore, json_format):
+    in_message = create_in_message([create_box(0, 0, 600, 440)])
+    data_list = in_message.create_roi_publish_list(frame_store)
+    assert len(data_list) == 1
+    assert 'roi' not in json.loads(data_list[0])
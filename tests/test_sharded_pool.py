@@ -0,0 +1,125 @@
+import os
+import time
+from multiprocessing import Queue
+from queue import Empty
+from threading import Lock
+
+import pytest
+
+from core.event_handlers.sharded_pool import ShardedPool
+
+# inherited by the forked shard workers
+_results = Queue()
+
+
+def record(key: str, value: int, delay: float = 0.):
+    time.sleep(delay)
+    _results.put((key, value, os.getpid()))
+
+
+def crash():
+    os._exit(1)
+
+
+def read_results(count: int, timeout: float = 5.) -> list:
+    ret = []
+    deadline = time.monotonic() + timeout
+    while len(ret) < count and time.monotonic() < deadline:
+        try:
+            ret.append(_results.get(timeout=.1))
+        except Empty:
+            pass
+    return ret
+
+
+class Callbacks:
+    def __init__(self):
+        self.called = []
+        self.lock = Lock()
+
+    def create(self, value: int):
+        def fn():
+            with self.lock:
+                self.called.append(value)
+        return fn
+
+
+@pytest.fixture
+def pool():
+    pools = []
+
+    def create(process_count: int, capacity: int, check_interval: float = 1.) -> ShardedPool:
+        ret = ShardedPool(process_count, capacity, check_interval=check_interval)
+        ret.start()
+        pools.append(ret)
+        return ret
+
+    yield create
+    for p in pools:
+        p.close()
+        p.join()
+
+
+def wait_for(predicate, timeout: float = 5.):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(.01)
+    return predicate()
+
+
+def test_every_key_is_processed_by_the_same_worker(pool):
+    sharded_pool = pool(3, 100)
+    keys = [f'camera-{j}' for j in range(12)]
+    for i in range(5):
+        for key in keys:
+            sharded_pool.apply_async(key, record, (key, i))
+
+    results = read_results(len(keys) * 5)
+    assert len(results) == len(keys) * 5
+    pids = {}
+    for key, value, pid in results:
+        assert pids.setdefault(key, pid) == pid
+    assert len(set(pids.values())) <= 3
+    # in order per key
+    for key in keys:
+        assert [value for k, value, _ in results if k == key] == list(range(5))
+
+
+def test_busy_shard_keeps_only_the_latest_pending_task(pool):
+    sharded_pool = pool(1, 1)
+    callbacks = Callbacks()
+    sharded_pool.apply_async('cam', record, ('cam', 0, .3), callbacks.create(0))
+    for i in range(1, 6):
+        sharded_pool.apply_async('cam', record, ('cam', i), callbacks.create(i))
+
+    results = read_results(2)
+    assert [value for _, value, _ in results] == [0, 5]
+    assert wait_for(lambda: sorted(callbacks.called) == list(range(6)))
+    assert sharded_pool.dropped_count == 4
+
+
+def test_blocking_apply_waits_for_the_capacity_of_the_shard(pool):
+    sharded_pool = pool(1, 1)
+    sharded_pool.apply_async('cam', record, ('cam', 0, .3))
+    start = time.monotonic()
+    assert sharded_pool.apply_async('cam', record, ('cam', 1), block=True)
+
+    assert time.monotonic() - start > .2
+    assert [value for _, value, _ in read_results(2)] == [0, 1]
+    assert sharded_pool.dropped_count == 0
+
+
+def test_dead_worker_is_restarted(pool):
+    sharded_pool = pool(1, 2, .1)
+    callbacks = Callbacks()
+    first_pid = sharded_pool.processes[0].pid
+    sharded_pool.apply_async('cam', crash, (), callbacks.create(0))
+
+    assert wait_for(lambda: callbacks.called == [0])
+    assert wait_for(lambda: sharded_pool.processes[0].pid != first_pid and sharded_pool.processes[0].is_alive())
+    sharded_pool.apply_async('cam', record, ('cam', 1), callbacks.create(1))
+    assert [value for _, value, _ in read_results(1)] == [1]
+    assert wait_for(lambda: callbacks.called == [0, 1])
+    assert sharded_pool.in_flight == [0]
@@ -0,0 +1,79 @@
+from multiprocessing import Process
+
+import numpy as np
+import pytest
+
+from core.data_changed.shared_memory_prev_image_cache import SharedMemoryPrevImageCache
+
+
+@pytest.fixture
+def cache():
+    ret = SharedMemoryPrevImageCache(2, 100)
+    yield ret
+    ret.close(True)
+
+
+def test_image_is_copied_in_and_out(cache: SharedMemoryPrevImageCache):
+    img = np.arange(60, dtype=np.uint8).reshape((6, 10))
+    cache.set('a', img)
+    ret = cache.get('a')
+
+    assert np.array_equal(ret, img)
+    ret[:] = 0
+    assert np.array_equal(cache.get('a'), img)
+    assert cache.has('a') and not cache.has('b')
+    assert 'a' not in cache.dic
+
+
+def test_generation_changes_on_every_set(cache: SharedMemoryPrevImageCache):
+    cache.set('a', np.zeros((5, 5), dtype=np.uint8))
+    generation = cache.get_generation('a')
+    cache.set('a', np.ones((5, 5), dtype=np.uint8))
+    assert cache.get_generation('a') == generation + 1
+
+
+def test_image_set_by_a_worker_is_seen_by_the_others(cache: SharedMemoryPrevImageCache):
+    process = Process(target=cache.set, args=('a', np.full((4, 4), 7, dtype=np.uint8)))
+    process.start()
+    process.join(5.)
+
+    assert np.array_equal(cache.get('a'), np.full((4, 4), 7, dtype=np.uint8))
+
+
+def test_removed_slot_is_allocated_for_another_source(cache: SharedMemoryPrevImageCache):
+    cache.set('a', np.zeros((5, 5), dtype=np.uint8))
+    cache.set('b', np.zeros((5, 5), dtype=np.uint8))
+    cache.remove('a')
+    cache.set('c', np.ones((5, 5), dtype=np.uint8))
+
+    assert cache.get('a') is None
+    assert np.array_equal(cache.get('c'), np.ones((5, 5), dtype=np.uint8))
+    assert 'c' not in cache.dic
+
+
+# none of them raises, the image is kept in the process memory instead
+@pytest.mark.parametrize('source_id, img', [
+    ('big', np.zeros((10, 10, 3), dtype=np.uint8)),
+    ('x' * 100, np.zeros((5, 5), dtype=np.uint8)),
+])
+def test_image_which_does_not_fit_a_slot_falls_back_to_the_process_memory(cache: SharedMemoryPrevImageCache, source_id: str, img):
+    for _ in range(3):
+        cache.set(source_id, img)
+
+    assert np.array_equal(cache.get(source_id), img)
+    assert cache.has(source_id)
+    cache.remove(source_id)
+    assert cache.get(source_id) is None
+
+
+def test_source_falls_back_to_the_process_memory_when_no_slot_is_left(cache: SharedMemoryPrevImageCache):
+    cache.set('a', np.zeros((5, 5), dtype=np.uint8))
+    cache.set('b', np.zeros((5, 5), dtype=np.uint8))
+    cache.set('c', np.full((5, 5), 3, dtype=np.uint8))
+    assert 'c' in cache.dic
+    assert np.array_equal(cache.get('c'), np.full((5, 5), 3, dtype=np.uint8))
+
+    cache.remove('a')
+    cache.set('c', np.full((5, 5), 4, dtype=np.uint8))
+    assert 'c' not in cache.dic
+    assert np.array_equal(cache.get('c'), np.full((5, 5), 4, dtype=np.uint8))
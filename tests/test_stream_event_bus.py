@@ -0,0 +1,175 @@
+import time
+import uuid
+from threading import Thread, Lock
+
+import pytest
+from redis import Redis
+from redis.exceptions import ConnectionError, ResponseError
+
+from common.config import config_redis
+from common.event_bus.event_handler import EventHandler
+from common.event_bus.stream_event_bus import StreamEventBus
+
+
+class CollectingHandler(EventHandler):
+    def __init__(self, ack: bool):
+        self.ack = ack
+        self.events = []
+        self.lock = Lock()
+
+    def handle(self, dic: dict):
+        with self.lock:
+            self.events.append(dic)
+        if self.ack:
+            dic['ack']()
+
+
+@pytest.fixture
+def connection():
+    conn = Redis(host=config_redis.host, port=config_redis.port, db=15)
+    try:
+        conn.ping()
+    except ConnectionError:
+        pytest.skip(f'no redis server on {config_redis.host}:{config_redis.port}')
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def listeners():
+    threads = []
+    yield threads
+    for th in threads:
+        th.join(5.)
+
+
+# the listeners exit with NOGROUP once the stream is deleted
+@pytest.fixture
+def channel(connection: Redis, listeners: list):
+    name = f'test_stream_{uuid.uuid4().hex}'
+    yield name
+    connection.delete(name)
+
+
+def create_bus(connection: Redis, channel: str, consumer_name: str, claim_min_idle: int = 0) -> StreamEventBus:
+    bus = StreamEventBus(channel, 'test_group', 0, claim_min_idle, block=100, connection=connection)
+    bus.consumer_name = consumer_name
+    return bus
+
+
+def listen(listeners: list, bus: StreamEventBus, handler: EventHandler):
+    def fn():
+        try:
+            bus.subscribe_async(handler)
+        except ResponseError:
+            pass
+
+    th = Thread(target=fn, daemon=True)
+    th.start()
+    listeners.append(th)
+
+
+def wait_for(predicate, timeout: float = 5.):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(.02)
+    return predicate()
+
+
+def get_pending_count(connection: Redis, channel: str) -> int:
+    return connection.xpending(channel, 'test_group')['pending']
+
+
+def test_consumers_of_a_group_share_the_entries(connection: Redis, channel: str, listeners: list):
+    bus_a, bus_b = create_bus(connection, channel, 'a'), create_bus(connection, channel, 'b')
+    bus_a.create_group()
+    for i in range(20):
+        bus_a.publish(str(i))
+
+    handler_a, handler_b = CollectingHandler(True), CollectingHandler(True)
+    listen(listeners, bus_a, handler_a)
+    listen(listeners, bus_b, handler_b)
+
+    assert wait_for(lambda: len(handler_a.events) + len(handler_b.events) == 20)
+    data = sorted(int(e['data']) for e in handler_a.events + handler_b.events)
+    assert data == list(range(20))
+    assert all(e['type'] == 'message' for e in handler_a.events + handler_b.events)
+    assert wait_for(lambda: get_pending_count(connection, channel) == 0)
+
+
+def test_entry_stays_pending_until_it_is_acknowledged(connection: Redis, channel: str, listeners: list):
+    bus = create_bus(connection, channel, 'a')
+    bus.create_group()
+    bus.publish('frame')
+    handler = CollectingHandler(False)
+    listen(listeners, bus, handler)
+
+    assert wait_for(lambda: len(handler.events) == 1)
+    assert get_pending_count(connection, channel) == 1
+    handler.events[0]['ack']()
+    assert get_pending_count(connection, channel) == 0
+
+
+def test_pending_entries_of_a_dead_consumer_are_claimed(connection: Redis, channel: str):
+    bus = create_bus(connection, channel, 'alive', claim_min_idle=50)
+    bus.create_group()
+    bus.publish('frame')
+    # the dead consumer reads the entry and never acknowledges it
+    connection.xreadgroup('test_group', 'dead', {channel: '>'}, count=10)
+    assert get_pending_count(connection, channel) == 1
+
+    time.sleep(.1)
+    handler = CollectingHandler(True)
+    bus.claim_pending(handler.handle)
+
+    assert [e['data'] for e in handler.events] == [b'frame']
+    assert get_pending_count(connection, channel) == 0
+    names = [c['name'] for c in connection.xinfo_consumers(channel, 'test_group')]
+    assert b'dead' not in names and 'dead' not in names
+
+
+def test_failed_entry_is_acknowledged(connection: Redis, channel: str):
+    bus = create_bus(connection, channel, 'a', claim_min_idle=50)
+    bus.create_group()
+    bus.publish('frame')
+    connection.xreadgroup('test_group', 'dead', {channel: '>'}, count=10)
+    time.sleep(.1)
+
+    def fail(_):
+        raise ValueError('broken frame')
+
+    bus.claim_pending(fail)
+
+    assert get_pending_count(connection, channel) == 0
+
+
+def test_own_pending_entries_are_not_claimed(connection: Redis, channel: str):
+    bus = create_bus(connection, channel, 'a', claim_min_idle=50)
+    bus.create_group()
+    bus.publish('frame')
+    # still in a worker of this consumer
+    connection.xreadgroup('test_group', 'a', {channel: '>'}, count=10)
+    time.sleep(.1)
+
+    handler = CollectingHandler(True)
+    bus.claim_pending(handler.handle)
+
+    assert handler.events == []
+    assert get_pending_count(connection, channel) == 1
+
+
+def test_stale_pending_entries_are_acknowledged_without_being_handled(connection: Redis, channel: str):
+    bus = create_bus(connection, channel, 'alive', claim_min_idle=50)
+    bus.claim_max_age = 80
+    bus.create_group()
+    bus.publish('frame')
+    connection.xreadgroup('test_group', 'dead', {channel: '>'}, count=10)
+    time.sleep(.2)
+
+    handler = CollectingHandler(True)
+    bus.claim_pending(handler.handle)
+
+    assert handler.events == []
+    assert get_pending_count(connection, channel) == 0
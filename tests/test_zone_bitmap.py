@@ -0,0 +1,72 @@
+import random
+
+import numpy as np
+from shapely.geometry import Polygon, box
+
+from core.data_changed.od.zone_bitmap import ZoneBitmap, rasterize
+from core.filters.detections import DetectionBox
+
+
+def create_box(x1: int, y1: int, x2: int, y2: int) -> DetectionBox:
+    ret = DetectionBox()
+    ret.x1, ret.y1, ret.x2, ret.y2 = x1, y1, x2, y2
+    return ret
+
+
+def create_polygons() -> list:
+    return [Polygon([(100, 100), (300, 100), (300, 250), (100, 250)]), Polygon([(400, 50), (600, 300), (350, 400)])]
+
+
+def get_distances(polygons: list, boxes: list) -> np.ndarray:
+    return np.array([min(polygon.distance(box(b.x1, b.y1, b.x2, b.y2)) for polygon in polygons) for b in boxes])
+
+
+def get_overlaps(polygons: list, boxes: list) -> np.ndarray:
+    ret = []
+    for b in boxes:
+        area = box(b.x1, b.y1, b.x2, b.y2)
+        covered = sum(polygon.intersection(area).area for polygon in polygons)
+        ret.append(covered / area.area)
+    return np.array(ret)
+
+
+def create_random_boxes(count: int) -> list:
+    rnd = random.Random(11)
+    ret = []
+    for _ in range(count):
+        x, y = rnd.randint(0, 600), rnd.randint(0, 440)
+        ret.append(create_box(x, y, x + rnd.randint(10, 80), y + rnd.randint(10, 80)))
+    return ret
+
+
+# the bitmap is exact up to the pixels on the edges of the polygons, the boxes around the thresholds are left out
+def test_any_overlap_matches_the_polygons():
+    polygons, boxes = create_polygons(), create_random_boxes(300)
+    overlaps = get_overlaps(polygons, boxes)
+    ret = ZoneBitmap(polygons, 640, 480, 0.).intersects(boxes)
+
+    clear = (get_distances(polygons, boxes) > 2.) | (overlaps > .05)
+    assert clear.sum() > 200
+    assert np.array_equal(ret[clear], overlaps[clear] > 0.)
+
+
+def test_min_overlap_matches_the_polygons():
+    polygons, boxes = create_polygons(), create_random_boxes(300)
+    overlaps = get_overlaps(polygons, boxes)
+    ret = ZoneBitmap(polygons, 640, 480, .5).intersects(boxes)
+
+    clear = np.abs(overlaps - .5) > .05
+    assert clear.sum() > 200
+    assert np.array_equal(ret[clear], overlaps[clear] >= .5)
+
+
+def test_boxes_out_of_the_frame_are_clamped():
+    bitmap = ZoneBitmap([Polygon([(0, 0), (10, 0), (10, 10), (0, 10)])], 20, 20, 0.)
+    boxes = [create_box(-5, -5, 2, 2), create_box(30, 30, 40, 40), create_box(15, 15, 25, 25)]
+    assert bitmap.intersects(boxes).tolist() == [True, False, False]
+
+
+def test_rasterize_scales_the_polygons():
+    bitmap = rasterize([Polygon([(0, 0), (10, 0), (10, 10), (0, 10)])], 10, 10, .5, .5, 255)
+    assert bitmap[:5, :5].min() == 255
+    assert bitmap[7:, 7:].max() == 0